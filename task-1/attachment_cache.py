@@ -0,0 +1,278 @@
+import os
+import re
+import base64
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import BinaryIO, Iterable, Iterator, Optional
+import anyio
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Cache configuration
+ATTACHMENT_CACHE_DIR = os.getenv("ATTACHMENT_CACHE_DIR", ".attachment_cache")
+ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("ATTACHMENT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Chunk size for reading cached files (a multiple of 3 so base64 chunks need no padding)
+READ_CHUNK_SIZE = 3 * 32 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+@dataclass(frozen=True)
+class CachedAttachment:
+    """Attachment content stored in the cache.
+
+    ``file`` is opened when the entry is looked up, so the content stays
+    readable even if the blob is evicted before the response is sent.
+    """
+    path: str
+    digest: str
+    size: int
+    file: BinaryIO = field(compare=False, repr=False)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+class AttachmentCache:
+    """Content-addressed on-disk attachment cache with LRU eviction.
+
+    Content is stored once per SHA-256 digest under ``blobs/``; each
+    (message_id, attachment_id) pair is a small file under ``keys/`` holding
+    the digest of its content. When the blobs exceed ``max_bytes`` the least
+    recently used ones are removed together with the keys pointing at them.
+
+    Lookups touch the disk, so async callers should run them in a thread.
+    """
+
+    def __init__(self, directory: str = ATTACHMENT_CACHE_DIR, max_bytes: int = ATTACHMENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._blob_dir = os.path.join(directory, "blobs")
+        self._key_dir = os.path.join(directory, "keys")
+        os.makedirs(self._blob_dir, exist_ok=True)
+        os.makedirs(self._key_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._keys = {}  # key file name -> digest
+        self._blobs = OrderedDict()  # digest -> size, least recently used first
+        self._total_bytes = 0
+        self._load()
+
+    def get(self, message_id: str, attachment_id: str) -> Optional[CachedAttachment]:
+        """Look up and open a cached attachment, marking it as recently used.
+
+        A blob that has vanished from disk is treated as a miss.
+        """
+        key = self._key(message_id, attachment_id)
+        with self._lock:
+            digest = self._keys.get(key)
+            if digest is None or digest not in self._blobs:
+                return None
+            # Opened under the lock, so eviction cannot remove the blob first
+            entry = self._open(digest)
+            if entry is None:
+                self._forget(digest)
+                return None
+            self._blobs.move_to_end(digest)
+
+        try:
+            # Keep the access order across restarts
+            os.utime(entry.path)
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def put(self, message_id: str, attachment_id: str, chunks: Iterable[bytes]) -> CachedAttachment:
+        """Write attachment content to the cache and return the stored entry, opened."""
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                for chunk in chunks:
+                    sha256.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+            os.replace(tmp_path, self._blob_path(digest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        key = self._key(message_id, attachment_id)
+        with open(os.path.join(self._key_dir, key), "w") as key_file:
+            key_file.write(digest)
+
+        with self._lock:
+            self._keys[key] = digest
+            if digest not in self._blobs:
+                self._total_bytes += size
+            self._blobs[digest] = size
+            self._blobs.move_to_end(digest)
+            entry = self._open(digest)
+            self._evict(keep=digest)
+        return entry
+
+    def _open(self, digest: str) -> Optional[CachedAttachment]:
+        path = self._blob_path(digest)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        return CachedAttachment(path, digest, self._blobs[digest], file)
+
+    def _evict(self, keep: str) -> None:
+        while self._total_bytes > self.max_bytes and len(self._blobs) > 1:
+            digest = next(iter(self._blobs))
+            if digest == keep:
+                break
+            self._forget(digest)
+            self._remove(self._blob_path(digest))
+
+    def _forget(self, digest: str) -> None:
+        self._total_bytes -= self._blobs.pop(digest)
+        for key in [k for k, d in self._keys.items() if d == digest]:
+            del self._keys[key]
+            self._remove(os.path.join(self._key_dir, key))
+
+    def _load(self) -> None:
+        blobs = []
+        for name in os.listdir(self._blob_dir):
+            stat = os.stat(self._blob_path(name))
+            blobs.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(blobs):
+            self._blobs[digest] = size
+            self._total_bytes += size
+
+        for key in os.listdir(self._key_dir):
+            with open(os.path.join(self._key_dir, key)) as key_file:
+                digest = key_file.read().strip()
+            if digest in self._blobs:
+                self._keys[key] = digest
+            else:
+                self._remove(os.path.join(self._key_dir, key))
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._blob_dir, digest)
+
+    @staticmethod
+    def _key(message_id: str, attachment_id: str) -> str:
+        # Attachment ids are long and not filesystem-safe, so keys are hashed
+        return hashlib.sha256(f"{message_id}/{attachment_id}".encode()).hexdigest()
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def iter_file(file: BinaryIO) -> Iterator[bytes]:
+    """Read an open file in chunks, closing it at the end."""
+    with file:
+        while True:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_file_base64(file: BinaryIO) -> Iterator[bytes]:
+    """Read an open file as standard base64 in chunks, closing it at the end."""
+    for chunk in iter_file(file):
+        yield base64.b64encode(chunk)
+
+class BlobResponse(Response):
+    """Send count bytes of an open file from offset, closing the file afterwards.
+
+    Servers that offer the ASGI zero-copy send extension get the file
+    itself and can send it with sendfile; otherwise it is read in chunks on
+    a worker thread. The file is open before the response starts, so an
+    eviction meanwhile only unlinks the blob, like a deferred delete.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int, count: int, status_code: int = 200, headers: Optional[dict] = None):
+        self.file = file
+        self.offset = offset
+        self.count = count
+        self.status_code = status_code
+        self.media_type = "application/octet-stream"
+        self.background = None
+        self.init_headers({**(headers or {}), "Content-Length": str(count)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        with self.file:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file,
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+                return
+            await anyio.to_thread.run_sync(self.file.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(self.file.read, min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file was shorter than announced; end the body anyway
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def not_modified(request: Request, entry: CachedAttachment, headers: dict) -> Optional[Response]:
+    """A 304 response, closing the entry's file, if If-None-Match matches the entry."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or entry.etag in [t.strip() for t in if_none_match.split(",")]):
+        entry.file.close()
+        return Response(status_code=304, headers={**headers, "ETag": entry.etag})
+    return None
+
+def file_response(request: Request, entry: CachedAttachment, headers: dict) -> Response:
+    """Serve a cached attachment honouring If-None-Match and single byte ranges.
+
+    The content is sent from the entry's open file with a BlobResponse,
+    which closes it once the response has been sent.
+    """
+    headers = {**headers, "ETag": entry.etag, "Accept-Ranges": "bytes"}
+
+    response = not_modified(request, entry, headers)
+    if response is not None:
+        return response
+
+    range_header = request.headers.get("range")
+    match = _RANGE_PATTERN.match(range_header.strip()) if range_header else None
+    if match is None or (range_header and not _if_range_matches(request, entry)):
+        # No range (or an unsupported multi-range request): send the whole file
+        return BlobResponse(entry.file, 0, entry.size, headers=headers)
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), entry.size - 1) if last else entry.size - 1
+    elif last:
+        start = max(entry.size - int(last), 0)
+        end = entry.size - 1
+    else:
+        start, end = 0, -1
+    if start > end or start >= entry.size:
+        entry.file.close()
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{entry.size}"})
+
+    headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    return BlobResponse(entry.file, start, end - start + 1, status_code=206, headers=headers)
+
+def _if_range_matches(request: Request, entry: CachedAttachment) -> bool:
+    if_range = request.headers.get("if-range")
+    return if_range is None or if_range.strip() == entry.etag
@@ -1,12 +1,19 @@
 from datetime import datetime, timedelta
-from typing import Union
+from typing import List, Optional, Tuple, Union
 from jose import JWTError, jwt 
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import models, crud, database
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, database, schemas, instrumentation
 import os
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,13 +23,119 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+BULK_HASH_WORKERS = int(os.getenv("BULK_HASH_WORKERS", str(max(HASH_WORKERS // 2, 1))))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes with fewer rounds are replaced on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+
+# Worker pool for bcrypt; the bcrypt backend releases the GIL while hashing,
+# so threads spread the work across cores. Jobs beyond the queue limit are rejected.
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_LIMIT)
+
+# Separate, smaller pool for bulk imports, so an import never takes every core from logins
+_bulk_hash_executor = ThreadPoolExecutor(max_workers=BULK_HASH_WORKERS, thread_name_prefix="bcrypt-bulk")
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+class TokenCache:
+    """Bounded LRU cache of verified access tokens.
+
+    Entries are keyed by a hash of the token, so raw tokens are never kept
+    in memory, and expire together with the token's ``exp`` claim. Tokens
+    revoked on logout are remembered by hash until their ``exp`` as well;
+    the denylist is per process, like the cache itself.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # token hash -> (user, expiry timestamp)
+        self._revoked = {}  # token hash -> expiry timestamp
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Union[schemas.User, None]:
+        """Get the user for a cached token, or None if it is not cached."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, user: schemas.User, expires_at: float) -> None:
+        """Cache the user a token resolved to until expires_at, unless it has been revoked."""
+        key = self._key(token)
+        with self._lock:
+            # A verification that started before logout must not bring the token back
+            if key in self._revoked:
+                return
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        """Drop a single token, e.g. on logout."""
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def revoke(self, token: str, expires_at: float) -> None:
+        """Drop a token and reject it until expires_at, e.g. on logout."""
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            # Tokens past their exp are rejected by verification anyway
+            for revoked_key in [k for k, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[revoked_key]
+            self._revoked[key] = expires_at
+
+    def is_revoked(self, token: str) -> bool:
+        """Whether a token was revoked and has not expired yet."""
+        with self._lock:
+            expires_at = self._revoked.get(self._key(token))
+        return expires_at is not None and expires_at > time.time()
+
+    def invalidate_user(self, email: str) -> None:
+        """Drop every token of a user, e.g. when the user is deactivated."""
+        with self._lock:
+            for key in [k for k, (user, _) in self._entries.items() if user.email == email]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        """Get cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+token_cache = TokenCache()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -31,6 +144,59 @@ def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
 
+async def _run_hash_job(func, *args):
+    """Run a password hashing job on the worker pool, failing fast with 503 when overloaded."""
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        with instrumentation.span("hash"):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_hash_executor, functools.partial(func, *args))
+    finally:
+        _hash_slots.release()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password off the event loop.
+
+    Returns whether the password matched and, if the stored hash uses
+    outdated settings, a replacement hash to store.
+    """
+    return await _run_hash_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate password hash off the event loop."""
+    return await _run_hash_job(pwd_context.hash, password)
+
+async def hash_passwords_async(passwords: List[str]) -> List[str]:
+    """Hash many passwords on the bulk import pool."""
+    loop = asyncio.get_running_loop()
+    with instrumentation.span("hash"):
+        return list(await asyncio.gather(
+            *[loop.run_in_executor(_bulk_hash_executor, get_password_hash, password) for password in passwords]
+        ))
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash many passwords in parallel worker processes.
+
+    Only meant for offline tools such as import_users.py; the server uses
+    hash_passwords_async, whose threads are bounded by BULK_HASH_WORKERS.
+    """
+    if len(passwords) < 2:
+        return [get_password_hash(password) for password in passwords]
+    
+    workers = min(os.cpu_count() or 1, len(passwords))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(get_password_hash, passwords, chunksize=max(len(passwords) // (workers * 4), 1)))
+
+def shutdown() -> None:
+    """Stop the password hashing pools."""
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+    _bulk_hash_executor.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None) -> str:
     """Create JWT access token."""
     to_encode = data.copy()
@@ -41,16 +207,22 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(
-    db: Session = Depends(database.get_db),
+async def get_current_user(
+    db: AsyncSession = Depends(database.get_db),
     token: str = Depends(oauth2_scheme)
-) -> models.User:
+) -> schemas.User:
     """Get current authenticated user from JWT token."""
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if token_cache.is_revoked(token):
+        raise credentials_exception
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -60,8 +232,15 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
         
-    user = crud.get_user_by_email(db, email)
+    user = await crud.get_user_by_email(db, email)
     if user is None:
         raise credentials_exception
-        
-    return user
+    
+    current_user = schemas.User.model_validate(user)
+    token_cache.put(token, current_user, payload.get("exp", 0))
+    return current_user
+
+def revoke_token(token: str) -> None:
+    """Reject a verified access token from now until it expires."""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    token_cache.revoke(token, payload.get("exp", 0))
@@ -0,0 +1,69 @@
+"""Peak memory of one attachment download, buffered versus streamed.
+
+Buffered is the old path: decode the whole attachment, serve it from a
+BytesIO, and re-encode it whole for /base64. Streamed decodes chunk by chunk
+into the attachment cache and serves the file in chunks:
+
+    python benchmarks/bench_attachment_memory.py --size-mb 25
+
+Both paths start from the base64url string returned by Gmail, which is held
+in full either way; it is reported separately and not counted in the peaks.
+"""
+import argparse
+import base64
+import io
+import os
+import tempfile
+import tracemalloc
+import stubs  # Puts the app modules on sys.path
+import attachment_cache, email_service
+
+def buffered_download(data: str) -> None:
+    decoded = base64.urlsafe_b64decode(data)
+    stream = io.BytesIO(decoded)
+    for _ in iter(lambda: stream.read(email_service.ATTACHMENT_CHUNK_SIZE), b""):
+        pass
+
+def buffered_base64(data: str) -> None:
+    decoded = base64.urlsafe_b64decode(data)
+    body = {"attachment_data": base64.b64encode(decoded).decode("utf-8")}
+    del body
+
+def streamed_download(cache: attachment_cache.AttachmentCache, data: str) -> None:
+    entry = cache.put("message", "attachment", email_service.iter_decoded(data))
+    for _ in attachment_cache.iter_file(entry.file):
+        pass
+
+def streamed_base64(cache: attachment_cache.AttachmentCache, data: str) -> None:
+    entry = cache.put("message", "attachment", email_service.iter_decoded(data))
+    for _ in attachment_cache.iter_file_base64(entry.file):
+        pass
+
+def peak_bytes(run) -> int:
+    """Peak memory allocated by run beyond what was allocated before it."""
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    run()
+    return tracemalloc.get_traced_memory()[1] - before
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=25)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 2**20)
+    data = base64.urlsafe_b64encode(os.urandom(size)).decode()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = attachment_cache.AttachmentCache(directory, max_bytes=4 * size)
+        tracemalloc.start()
+        results = [
+            ("buffered download", peak_bytes(lambda: buffered_download(data))),
+            ("streamed download", peak_bytes(lambda: streamed_download(cache, data))),
+            ("buffered /base64", peak_bytes(lambda: buffered_base64(data))),
+            ("streamed /base64", peak_bytes(lambda: streamed_base64(cache, data))),
+        ]
+        tracemalloc.stop()
+
+    print(f"{args.size_mb:g} MiB attachment, Gmail response string {len(data) / 2**20:.1f} MiB (held in both paths)")
+    for name, peak in results:
+        print(f"{name:<18} peak {peak / 2**20:8.2f} MiB")
@@ -0,0 +1,60 @@
+"""Load test of the email endpoints against a FakeGmail with per-call latency.
+
+Sends concurrent /emails/{id} requests and, while they are in flight,
+logs in through /token, then compares the wall time with running the same
+Gmail calls one after another:
+
+    python benchmarks/bench_concurrency.py --requests 64 --latency 0.1
+"""
+import argparse
+import asyncio
+import time
+import stubs
+import httpx
+from fake_gmail import FakeGmail
+import auth, crud, email_service, main, response_cache
+
+class User:
+    id = 1
+    email = "user@example.com"
+    name = "User"
+    is_active = True
+
+async def authenticate_user(db, email, password):
+    return User()
+
+async def timed(request):
+    start = time.perf_counter()
+    response = await request
+    return response, time.perf_counter() - start
+
+async def run(requests: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        start = time.perf_counter()
+        emails = asyncio.gather(*[timed(http.get(f"/emails/m{i}")) for i in range(requests)])
+        await asyncio.sleep(0)
+        login, login_time = await timed(http.post("/token", data={"username": "a@example.com", "password": "pw"}))
+        results = await emails
+        wall = time.perf_counter() - start
+    assert login.status_code == 200 and all(response.status_code == 200 for response, _ in results)
+    return wall, sorted(latency for _, latency in results), login_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per Gmail call")
+    args = parser.parse_args()
+
+    email_service.scheduler = email_service.GmailScheduler(user_rate=1e9, global_rate=1e9)
+    email_service.get_gmail_service = lambda: FakeGmail(args.requests, delay=args.latency)
+    main.email_cache = response_cache.ResponseCache(response_cache.MemoryLRUBackend())
+    main.app.dependency_overrides[auth.get_current_user] = User
+    crud.authenticate_user = authenticate_user
+
+    wall, latencies, login_time = asyncio.run(run(args.requests))
+    serial = args.requests * args.latency
+    print(f"{args.requests} requests, {args.latency * 1000:.0f} ms per Gmail call, {email_service.GMAIL_WORKERS} workers")
+    print(f"wall time {wall:6.2f} s  (one after another: {serial:.2f} s, {serial / wall:.1f}x overlap)")
+    print(f"latency   p50 {stubs.percentile(latencies, 0.5) * 1000:6.0f} ms  p99 {stubs.percentile(latencies, 0.99) * 1000:6.0f} ms")
+    print(f"/token during the load {login_time * 1000:6.1f} ms")
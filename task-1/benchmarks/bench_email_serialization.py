@@ -0,0 +1,79 @@
+"""CPU time per 500-message /emails response, jsonable_encoder versus orjson.
+
+Before, /emails returned List[Dict[str, Any]], so FastAPI validated and ran
+jsonable_encoder over every email before the stdlib encoder. Now the
+listing is serialized once with orjson by the response cache:
+
+    python benchmarks/bench_email_serialization.py --requests 200 --messages 500
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+import stubs  # Puts the app modules on sys.path
+import httpx
+from fastapi import FastAPI
+import auth, email_service, main, response_cache
+
+class User:
+    id = 1
+    email = "user@example.com"
+
+def make_emails(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "message_id": f"18cc{i:012x}",
+            "subject": f"Weekly report {i}",
+            "sender": "Alice Example <alice@example.org>",
+            "timestamp": "January 01, 2024 10:00 AM",
+            "attachments": [
+                {"id": f"ANGjdJ{i}{j}" + "x" * 100, "filename": f"report{j}.pdf", "mimeType": "application/pdf"}
+                for j in range(i % 3)
+            ],
+        }
+        for i in range(count)
+    ]
+
+def legacy_app(emails: List[Dict[str, Any]]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/emails", response_model=List[Dict[str, Any]])
+    async def get_emails(max_results: int = 10):
+        return emails
+    return app
+
+def current_app() -> FastAPI:
+    app = FastAPI()
+    app.add_api_route("/emails", main.get_emails, response_class=main.ORJSONResponse)
+    app.dependency_overrides[auth.get_current_user] = User
+    return app
+
+async def cpu_per_request(app: FastAPI, requests: int, messages: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        url = f"/emails?max_results={messages}"
+        assert len((await http.get(url)).json()) == messages
+        start = time.process_time()
+        for _ in range(requests):
+            await http.get(url)
+        return (time.process_time() - start) / requests
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=500)
+    args = parser.parse_args()
+
+    emails = make_emails(args.messages)
+
+    async def fetch_emails_async(max_results, batch_size, metadata_only, **kwargs):
+        return emails
+    email_service.fetch_emails_async = fetch_emails_async
+    # No caching, so every request serializes the listing again
+    main.email_cache = response_cache.ResponseCache(response_cache.MemoryLRUBackend(), ttl=0)
+
+    before = asyncio.run(cpu_per_request(legacy_app(emails), args.requests, args.messages))
+    after = asyncio.run(cpu_per_request(current_app(), args.requests, args.messages))
+    print(f"{args.requests} requests of {args.messages} emails (CPU time includes the in-process client)")
+    print(f"jsonable_encoder + json {before * 1000:7.2f} ms CPU/request")
+    print(f"orjson                  {after * 1000:7.2f} ms CPU/request  {before / after:4.1f}x less")
@@ -0,0 +1,64 @@
+"""Per-request cost of getting a Gmail client, before and after the shared holder.
+
+Before, every request unpickled token.pickle and built a new discovery
+client; now the holder returns the current thread's cached client:
+
+    python benchmarks/bench_gmail_client.py --requests 200
+
+Credentials are unexpired offline credentials, so no network is used.
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+from datetime import datetime, timedelta
+import stubs  # Puts the app modules on sys.path
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+import email_service
+
+def write_token(path: str) -> None:
+    creds = Credentials(
+        token="access-token",
+        refresh_token="refresh-token",
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id="client-id",
+        client_secret="client-secret",
+        scopes=email_service.SCOPES,
+        expiry=datetime.utcnow() + timedelta(hours=1)
+    )
+    with open(path, "wb") as token:
+        pickle.dump(creds, token)
+
+def per_request_client(token_path: str):
+    """What get_gmail_service did on every request before the holder."""
+    with open(token_path, "rb") as token:
+        creds = pickle.load(token)
+    if not creds.valid:
+        raise RuntimeError("benchmark credentials expired")
+    return build("gmail", "v1", credentials=creds)
+
+def mean_seconds(get_client, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        get_client()
+    return (time.perf_counter() - start) / requests
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        token_path = os.path.join(directory, "token.pickle")
+        write_token(token_path)
+        holder = email_service.GmailServiceHolder(token_path=token_path)
+        holder.get_service()  # The first call per thread builds the client
+
+        before = mean_seconds(lambda: per_request_client(token_path), args.requests)
+        after = mean_seconds(holder.get_service, args.requests)
+
+    print(f"{args.requests} requests")
+    print(f"per-request client {before * 1000:9.3f} ms/request")
+    print(f"shared holder      {after * 1000:9.3f} ms/request  {before / after:8.0f}x faster")
@@ -0,0 +1,100 @@
+"""CPU overhead of the instrumentation middleware at a fixed request rate.
+
+Drives /emails/{id} (stubbed Gmail service, served from the response cache,
+so the handler itself is cheap) directly through ASGI at --rate requests per
+second to get the server CPU time per request. The middleware's own cost is
+measured separately around a trivial ASGI app, since a difference of a few
+microseconds is lost in the run-to-run noise of whole requests:
+
+    python benchmarks/bench_instrumentation.py --rate 1000 --seconds 5
+"""
+import argparse
+import asyncio
+import time
+import stubs
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+import auth, email_service, instrumentation, main
+
+class User:
+    id = 1
+    email = "user@example.com"
+
+async def get_email_data_async(message_id, metadata_only=False, **kwargs):
+    return {"message_id": message_id, "subject": "Hi", "sender": "a@example.com", "timestamp": "", "attachments": []}
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_api_route("/emails/{message_id}", main.get_email, response_class=ORJSONResponse)
+    app.dependency_overrides[auth.get_current_user] = User
+    return app
+
+async def call(app: FastAPI, path: str) -> int:
+    """Send one GET request straight to the ASGI app and return the status."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def paced(app: FastAPI, rate: float, seconds: float):
+    requests = int(rate * seconds)
+    for i in range(100):  # Warm-up, and fill the response cache
+        await call(app, f"/emails/m{i}")
+    start, cpu_start = time.perf_counter(), time.process_time()
+    tasks = []
+    for i in range(requests):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(call(app, f"/emails/m{i % 100}")))
+    statuses = await asyncio.gather(*tasks)
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    assert set(statuses) == {200}
+    return requests / wall, cpu / requests
+
+async def plain_response(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+async def cpu_per_call(app, calls: int) -> float:
+    start = time.process_time()
+    for _ in range(calls):
+        await call(app, "/")
+    return (time.process_time() - start) / calls
+
+def middleware_cost(calls: int) -> float:
+    """CPU seconds the middleware adds to a request, the median of three runs."""
+    instrumented = instrumentation.InstrumentationMiddleware(plain_response, instrumentation.MetricsRegistry())
+    return stubs.percentile([
+        asyncio.run(cpu_per_call(instrumented, calls)) - asyncio.run(cpu_per_call(plain_response, calls))
+        for _ in range(3)
+    ], 0.5)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--calls", type=int, default=100_000, help="calls per middleware cost run")
+    args = parser.parse_args()
+
+    email_service.get_email_data_async = get_email_data_async
+
+    rate, request_cpu = asyncio.run(paced(make_app(), args.rate, args.seconds))
+    overhead = middleware_cost(args.calls)
+    print(f"target {args.rate:.0f} req/s for {args.seconds:g} s, achieved {rate:.0f} req/s")
+    print(f"request without instrumentation {request_cpu * 1e6:7.1f} us CPU")
+    print(f"instrumentation middleware      {overhead * 1e6:7.1f} us CPU  "
+          f"{overhead / request_cpu:5.1%} of the request, {overhead * args.rate:5.1%} of a core at the target rate")
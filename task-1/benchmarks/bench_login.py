@@ -0,0 +1,75 @@
+"""Concurrent logins with bcrypt on the event loop versus on the hashing pool.
+
+Sends a burst of /token logins for a user in a SQLite database and, while
+they run, probes /metrics to see how long other requests wait:
+
+    python benchmarks/bench_login.py --logins 16
+
+Inline runs bcrypt on the event loop, as the handlers did before the pool.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_directory.name, 'users.db')}"
+
+import stubs
+import httpx
+import auth, database, main, models
+
+EMAIL, PASSWORD = "user@example.com", "correct horse battery staple"
+
+async def inline_verify(plain_password, hashed_password):
+    return auth.pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def probe(http: httpx.AsyncClient, latencies: list, done: asyncio.Event, interval: float = 0.01) -> None:
+    # Latency counts from when each probe was due, so time the event loop was blocked is included
+    due = time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        await http.get("/metrics")
+        latencies.append(time.perf_counter() - due)
+        due += interval
+
+async def burst(logins: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        latencies, done = [], asyncio.Event()
+        prober = asyncio.create_task(probe(http, latencies, done))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            http.post("/token", data={"username": EMAIL, "password": PASSWORD}) for _ in range(logins)
+        ])
+        wall = time.perf_counter() - start
+        done.set()
+        await prober
+    statuses = [response.status_code for response in responses]
+    return wall, statuses, latencies
+
+def report(name: str, wall: float, statuses: list, latencies: list) -> None:
+    print(
+        f"{name:<6} {wall:6.2f} s  {statuses.count(200)} ok, {statuses.count(503)} busy  "
+        f"/metrics p50 {stubs.percentile(latencies, 0.5) * 1000:7.1f} ms  "
+        f"p99 {stubs.percentile(latencies, 0.99) * 1000:7.1f} ms  max {max(latencies) * 1000:7.1f} ms"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=16)
+    args = parser.parse_args()
+
+    with database.SessionLocal() as db:
+        db.add(models.User(email=EMAIL, name="User", hashed_password=auth.get_password_hash(PASSWORD)))
+        db.commit()
+
+    print(f"{args.logins} concurrent logins, {auth.HASH_WORKERS} hashing threads, {os.cpu_count()} CPUs")
+    pooled = auth.verify_password_async
+    auth.verify_password_async = inline_verify
+    report("inline", *asyncio.run(burst(args.logins)))
+    auth.verify_password_async = pooled
+    report("pool", *asyncio.run(burst(args.logins)))
+    _directory.cleanup()
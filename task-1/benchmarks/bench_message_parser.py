@@ -0,0 +1,78 @@
+"""Listing-field extraction speed, the old get_email_data parsing versus message_parser.
+
+Parses the Gmail message resources in message_corpus.json, which cover
+plain, alternative, mixed, forwarded and inline-image messages with the
+relay headers Gmail adds, plus malformed and missing Date headers:
+
+    python benchmarks/bench_message_parser.py --messages 100000
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict
+import stubs  # Puts the app modules on sys.path
+import message_parser
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "message_corpus.json")
+
+LEGACY_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S %z"
+
+def legacy_parses_date(date: str) -> bool:
+    try:
+        datetime.strptime(date, LEGACY_DATE_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+def legacy_parse(message: Dict[str, Any]) -> Dict[str, Any]:
+    """The parsing part of get_email_data before message_parser."""
+    headers = message["payload"]["headers"]
+    subject = next((h["value"] for h in headers if h["name"].lower() == "subject"), "No Subject")
+    sender = next((h["value"] for h in headers if h["name"].lower() == "from"), "Unknown")
+    date = next((h["value"] for h in headers if h["name"].lower() == "date"), "")
+    try:
+        timestamp = datetime.strptime(date, LEGACY_DATE_FORMAT)
+        formatted_date = timestamp.strftime("%B %d, %Y %I:%M %p")
+    except ValueError:
+        formatted_date = datetime.now().strftime("%B %d, %Y %I:%M %p")
+    attachments = []
+    if "parts" in message["payload"]:
+        for part in message["payload"]["parts"]:
+            if part.get("filename"):
+                attachments.append({
+                    "id": part["body"].get("attachmentId"),
+                    "filename": part["filename"],
+                    "mimeType": part["mimeType"]
+                })
+    return {"sender": sender, "subject": subject, "timestamp": formatted_date, "attachments": attachments}
+
+def run(parse, messages):
+    start = time.perf_counter()
+    results = [parse(message) for message in messages]
+    return time.perf_counter() - start, results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with open(CORPUS) as file:
+        corpus = json.load(file)
+    messages = (corpus * (args.messages // len(corpus) + 1))[:args.messages]
+
+    legacy_time, legacy = run(legacy_parse, messages)
+    parser_time, parsed = run(message_parser.parse_message, messages)
+
+    def attachments(results):
+        return sum(len(result["attachments"]) for result in results[:len(corpus)])
+
+    dates = [message_parser.parse_headers(message["payload"]["headers"]).get("date", "") for message in corpus]
+
+    print(f"{args.messages:,} messages from a corpus of {len(corpus)}")
+    print(f"legacy         {legacy_time:6.2f} s  {args.messages / legacy_time:9,.0f} msg/s")
+    print(f"message_parser {parser_time:6.2f} s  {args.messages / parser_time:9,.0f} msg/s  {legacy_time / parser_time:4.1f}x")
+    print(f"per corpus pass: attachments found {attachments(legacy)} -> {attachments(parsed)}, "
+          f"Date headers understood {sum(map(legacy_parses_date, dates))} -> "
+          f"{sum(message_parser.parse_date(date) is not None for date in dates)} of {len(dates)}")
@@ -0,0 +1,88 @@
+"""Throughput of /emails/{id} with the BaseHTTPMiddleware and pure ASGI secure headers.
+
+Each app serves main.get_email with a stubbed Gmail service and no
+response caching, differing only in the secure headers middleware:
+
+    python benchmarks/bench_middleware.py --requests 5000 --concurrency 16
+"""
+import argparse
+import asyncio
+import time
+import stubs
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+import auth, email_service, main, middleware, response_cache
+
+class LegacySecureHeadersMiddleware(BaseHTTPMiddleware):
+    """SecureHeadersMiddleware as it was before the pure ASGI version."""
+
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        response.headers.update({
+            "X-Content-Type-Options": "nosniff",
+            "X-Frame-Options": "DENY",
+            "X-XSS-Protection": "1; mode=block",
+            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+            "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';",
+            "Referrer-Policy": "strict-origin-when-cross-origin",
+            "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
+        })
+        return response
+
+class User:
+    id = 1
+    email = "user@example.com"
+
+async def get_email_data_async(message_id, metadata_only=False, **kwargs):
+    return {
+        "message_id": message_id,
+        "subject": "Quarterly report",
+        "sender": "sender@example.com",
+        "timestamp": "January 01, 2024 10:00 AM",
+        "attachments": [{"id": "a1", "filename": "report.pdf", "mimeType": "application/pdf"}],
+    }
+
+def make_app(secure_headers) -> FastAPI:
+    app = FastAPI()
+    app.add_api_route("/emails/{message_id}", main.get_email, response_class=ORJSONResponse)
+    app.dependency_overrides[auth.get_current_user] = User
+    if secure_headers is not None:
+        app.add_middleware(secure_headers)
+    return app
+
+async def load(app: FastAPI, requests: int, concurrency: int):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def worker(ids):
+            for i in ids:
+                start = time.perf_counter()
+                response = await http.get(f"/emails/m{i}")
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+        await worker(range(100))  # Warm-up
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(range(w, requests, concurrency)) for w in range(concurrency)])
+        wall = time.perf_counter() - start
+    return requests / wall, stubs.percentile(latencies, 0.99)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    email_service.get_email_data_async = get_email_data_async
+    main.email_cache = response_cache.ResponseCache(response_cache.MemoryLRUBackend(), ttl=0)
+
+    print(f"{args.requests} requests to /emails/{{id}}, {args.concurrency} concurrent")
+    for name, secure_headers in [
+        ("no middleware", None),
+        ("BaseHTTPMiddleware", LegacySecureHeadersMiddleware),
+        ("pure ASGI", middleware.SecureHeadersMiddleware),
+    ]:
+        rate, p99 = asyncio.run(load(make_app(secure_headers), args.requests, args.concurrency))
+        print(f"{name:<19} {rate:8.0f} req/s  p99 {p99 * 1000:6.2f} ms")
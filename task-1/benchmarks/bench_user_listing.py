@@ -0,0 +1,64 @@
+"""User listing pages with OFFSET versus keyset pagination.
+
+Fills a SQLite users table with synthetic users, then times fetching one
+page at increasing depths with crud.get_user (OFFSET, full ORM objects)
+and crud.list_users (keyset on id, schemas.User columns only):
+
+    python benchmarks/bench_user_listing.py --users 1000000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_directory.name, 'users.db')}"
+
+import stubs  # Puts the app modules on sys.path
+from sqlalchemy import insert
+import crud, database, models
+
+def fill(users: int, chunk_size: int = 50_000) -> None:
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as connection:
+        for start in range(0, users, chunk_size):
+            connection.execute(insert(models.User), [
+                {"email": f"user{i}@example.com", "name": f"User {i}", "hashed_password": "x" * 60}
+                for i in range(start, min(start + chunk_size, users))
+            ])
+
+async def mean_seconds(fetch, repeats: int) -> float:
+    async with database.AsyncSessionLocal() as db:
+        await fetch(db)  # Warm the page cache
+        start = time.perf_counter()
+        for _ in range(repeats):
+            rows = await fetch(db)
+            db.expunge_all()
+        assert len(rows) > 0
+        return (time.perf_counter() - start) / repeats
+
+async def run(users: int, page_size: int, repeats: int):
+    results = []
+    for fraction in (0, 0.1, 0.5, 0.9, 0.999):
+        depth = int(users * fraction)
+        # Ids are 1..users, so the page after id `depth` is the page at offset `depth`
+        offset = await mean_seconds(lambda db: crud.get_user(db, skip=depth, limit=page_size), repeats)
+        keyset = await mean_seconds(lambda db: crud.list_users(db, after_id=depth, limit=page_size), repeats)
+        results.append((depth, offset, keyset))
+    await database.async_engine.dispose()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fill(args.users)
+    print(f"{args.users:,} users inserted in {time.perf_counter() - start:.1f} s, pages of {args.page_size}")
+    for depth, offset, keyset in asyncio.run(run(args.users, args.page_size, args.repeats)):
+        print(f"depth {depth:>9,}  OFFSET {offset * 1000:8.2f} ms  keyset {keyset * 1000:6.2f} ms  {offset / keyset:6.1f}x")
+    _directory.cleanup()
@@ -0,0 +1,22 @@
+"""Environment and stand-ins shared by the benchmarks.
+
+Importing this module puts the app modules and the test fakes on sys.path
+and provides the settings the app reads at import time, so the benchmarks
+run without a database server or Gmail credentials.
+"""
+import os
+import sys
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, os.path.join(_ROOT, "tests"))
+
+os.environ.setdefault("DB_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
@@ -1,43 +1,215 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-import models, schemas, auth
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models, schemas, auth, database
 from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import base64
+import binascii
+import os
 
-def get_users(db: Session, user_id: int):
+# Seconds between flushes of buffered last_login updates
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "10"))
+
+# Users inserted per statement by bulk_create_users
+BULK_INSERT_CHUNK_SIZE = 1000
+
+# Rows fetched per round trip when streaming users
+USER_STREAM_BATCH_SIZE = 1000
+
+# Buffered last_login timestamps by user id, written in bulk by flush_last_logins
+_pending_logins: Dict[int, datetime] = {}
+
+async def get_users(db: AsyncSession, user_id: int):
     """Get user by ID."""
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return await db.get(models.User, user_id)
 
-def get_user_by_email(db: Session, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Get user by email."""
-    return db.query(models.User).filter(models.User.email == email).first()
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
 
-def get_user(db: Session, skip: int = 0, limit: int = 100):
+async def get_user(db: AsyncSession, skip: int = 0, limit: int = 100):
     """Get list of users with pagination."""
-    return db.query(models.User).offset(skip).limit(limit).all()
-
-def create_user(db: Session, user: schemas.UserCreate):
-    """Create a new user."""
-    hashed_password = auth.get_password_hash(user.password)
-    db_user = models.User(
-        email=user.email,
-        name=user.name,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    result = await db.execute(select(models.User).offset(skip).limit(limit))
+    return result.scalars().all()
+
+async def list_users(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    """Get a page of users ordered by id, starting after after_id.
+
+    Only the columns of schemas.User are selected, and the page is found
+    through the primary key index instead of an OFFSET scan.
+    """
+    result = await db.execute(_user_listing(after_id).limit(limit))
+    return result.all()
+
+async def stream_users(db: AsyncSession, after_id: Optional[int] = None) -> AsyncIterator:
+    """Stream all users ordered by id, starting after after_id, without loading them at once."""
+    result = await db.stream(_user_listing(after_id).execution_options(yield_per=USER_STREAM_BATCH_SIZE))
+    async for row in result:
+        yield row
+
+def _user_listing(after_id: Optional[int]):
+    statement = select(
+        models.User.id, models.User.email, models.User.name, models.User.is_active
+    ).order_by(models.User.id)
+    if after_id is not None:
+        statement = statement.where(models.User.id > after_id)
+    return statement
+
+def encode_cursor(user_id: int) -> str:
+    """Encode a user id as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(f"user:{user_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a pagination cursor, raising ValueError if it is malformed."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    prefix, _, user_id = value.partition(":")
+    if prefix != "user" or not user_id.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(user_id)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    """Create a new user, returning None if the email is already registered.
+
+    The user is written with a single INSERT ... RETURNING where the database
+    supports it (MySQL does not, so there the new row is read back by its
+    primary key); duplicates are detected by the unique index on users.email
+    rather than a prior lookup.
+    """
+    hashed_password = await auth.get_password_hash_async(user.password)
+    statement = insert(models.User).values(email=user.email, name=user.name, hashed_password=hashed_password)
+    try:
+        if db.bind.dialect.insert_returning:
+            result = await db.execute(
+                statement.returning(models.User.id, models.User.email, models.User.name, models.User.is_active)
+            )
+        else:
+            inserted = await db.execute(statement)
+            result = await db.execute(
+                _user_listing(None).where(models.User.id == inserted.inserted_primary_key[0])
+            )
+        db_user = result.one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
+async def bulk_create_users(
+    db: AsyncSession,
+    users: List[schemas.UserCreate],
+    hash_passwords: Optional[Callable[[List[str]], Awaitable[List[str]]]] = None
+) -> schemas.UserImportResult:
+    """Create many users with multi-row inserts, skipping emails that are already registered.
+
+    Passwords are hashed with hash_passwords, by default on the server's
+    bounded bulk hashing pool.
+    """
+    hash_passwords = hash_passwords or auth.hash_passwords_async
+    created, skipped = 0, []
+    seen = set()
+    for start in range(0, len(users), BULK_INSERT_CHUNK_SIZE):
+        chunk = users[start:start + BULK_INSERT_CHUNK_SIZE]
+        result = await db.execute(
+            select(models.User.email).where(models.User.email.in_([u.email for u in chunk]))
+        )
+        seen.update(result.scalars())
+        
+        new_users = []
+        for user in chunk:
+            if user.email in seen:
+                skipped.append(user.email)
+            else:
+                seen.add(user.email)
+                new_users.append(user)
+        if not new_users:
+            continue
+        
+        hashed_passwords = await hash_passwords([u.password for u in new_users])
+        rows = [
+            {"email": user.email, "name": user.name, "hashed_password": hashed_password}
+            for user, hashed_password in zip(new_users, hashed_passwords)
+        ]
+        try:
+            await db.execute(insert(models.User), rows)
+            await db.commit()
+            created += len(rows)
+        except IntegrityError:
+            # A concurrent registration took one of the emails; insert one by one instead
+            await db.rollback()
+            for row in rows:
+                try:
+                    await db.execute(insert(models.User), [row])
+                    await db.commit()
+                    created += 1
+                except IntegrityError:
+                    await db.rollback()
+                    skipped.append(row["email"])
+    
+    return schemas.UserImportResult(created=created, skipped=skipped)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """Authenticate user with email and password."""
-    user = get_user_by_email(db, email)
-    if not user or not auth.verify_password(password, user.hashed_password):
+    user = await get_user_by_email(db, email)
+    if not user:
+        return False
+    
+    valid, new_hash = await auth.verify_password_async(password, user.hashed_password)
+    if not valid:
         return False
     
-    # Update last_login timestamp
-    user.last_login = datetime.now()
-    db.commit()
-    db.refresh(user)
+    # Upgrade hashes created with outdated bcrypt settings
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    # The last_login timestamp is written later in bulk
+    record_login(user.id)
     
     return user
 
+def record_login(user_id: int) -> None:
+    """Buffer a last_login update for the next flush."""
+    _pending_logins[user_id] = datetime.now()
+
+async def flush_last_logins(db: AsyncSession) -> int:
+    """Write buffered last_login updates in one bulk UPDATE and return how many were written."""
+    if not _pending_logins:
+        return 0
+    
+    pending = dict(_pending_logins)
+    _pending_logins.clear()
+    try:
+        await db.execute(
+            update(models.User),
+            [{"id": user_id, "last_login": last_login} for user_id, last_login in pending.items()]
+        )
+        await db.commit()
+    except Exception:
+        # Put the updates back unless a newer login has been buffered meanwhile
+        for user_id, last_login in pending.items():
+            _pending_logins.setdefault(user_id, last_login)
+        raise
+    return len(pending)
+
+async def run_last_login_flusher(interval: float = LAST_LOGIN_FLUSH_INTERVAL) -> None:
+    """Flush buffered last_login updates every interval seconds, and once more when cancelled."""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    await flush_last_logins(db)
+            except Exception:
+                # Keep the updates buffered and retry on the next interval
+                pass
+    finally:
+        async with database.AsyncSessionLocal() as db:
+            await flush_last_logins(db)
+
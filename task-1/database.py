@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -9,15 +11,54 @@ load_dotenv()
 
 # Database configuration
 DB_URL = os.getenv("DB_URL")
-engine = create_engine(DB_URL, echo=True)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Async driver used for each database backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+}
+
+def get_async_url(url: str):
+    """Get the async-driver variant of a database URL."""
+    db_url = make_url(url)
+    backend = db_url.get_backend_name()
+    if backend in ASYNC_DRIVERS and db_url.get_driver_name() != ASYNC_DRIVERS[backend]:
+        db_url = db_url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return db_url
+
+def get_engine_options(url: str) -> dict:
+    """Get engine options from the environment."""
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    # SQLite uses single-connection pools that take no sizing options
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+# Synchronous engine for schema creation and background work on worker threads
+engine = create_engine(DB_URL, **get_engine_options(DB_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine for request handlers
+async_engine = create_async_engine(
+    os.getenv("DB_ASYNC_URL") or get_async_url(DB_URL), **get_engine_options(DB_URL)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    """Get database session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Get async database session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
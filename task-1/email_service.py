@@ -1,100 +1,539 @@
 import os
+import asyncio
 import base64
+import functools
 import pickle
+import collections
+import random
+import contextvars
+import threading
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from datetime import datetime
-from typing import List, Dict, Any
+from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
+from sqlalchemy.orm import Session
+import json
+import time
+import database, models, message_parser, instrumentation
 
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
-def get_gmail_service():
-    """Get authenticated Gmail service."""
-    creds = None
-    
-    # Load existing credentials if available
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-            
-    # Refresh or create new credentials
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            flow.redirect_uri = 'http://localhost:8080/'
-            creds = flow.run_local_server(port=8080)
-            
-        # Save credentials for future use
-        with open('token.pickle', 'wb') as token:
+# Maximum number of message requests grouped into one Gmail batch call (Gmail allows 100)
+BATCH_SIZE = 50
+
+# Partial-response mask for listings: headers and the MIME part tree without any body data
+_PART_FIELDS = 'filename,mimeType,body/attachmentId'
+_MAX_PART_DEPTH = 6
+METADATA_FIELDS = 'id,internalDate,payload(headers,{0}{1}{2})'.format(
+    _PART_FIELDS, ',parts({0}'.format(_PART_FIELDS) * _MAX_PART_DEPTH, ')' * _MAX_PART_DEPTH
+)
+
+# Worker threads for blocking Gmail calls, and how many calls may be running or queued at once
+GMAIL_WORKERS = int(os.getenv('GMAIL_WORKERS', '8'))
+GMAIL_MAX_PENDING = int(os.getenv('GMAIL_MAX_PENDING', '64'))
+
+# Size in bytes of the chunks attachments are streamed in
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+# Message ids requested per messages.list page, and how many listed pages may be
+# buffered ahead of the detail fetches
+LIST_PAGE_SIZE = 100
+PAGE_WINDOW = int(os.getenv('GMAIL_PAGE_WINDOW', '2'))
+
+# Most emails one listing may return, and most a non-streaming listing may hold in memory
+MAX_RESULTS = int(os.getenv('GMAIL_MAX_RESULTS', '10000'))
+MAX_BUFFERED_RESULTS = int(os.getenv('GMAIL_MAX_BUFFERED_RESULTS', '500'))
+
+# Local message store: how many recent messages the initial sync pulls in, and the
+# minimum number of seconds between background syncs triggered by store reads
+SYNC_INITIAL_MESSAGES = int(os.getenv('GMAIL_SYNC_INITIAL_MESSAGES', '500'))
+SYNC_INTERVAL = int(os.getenv('GMAIL_SYNC_INTERVAL', '30'))
+
+# Labels whose messages are left out of listings, as messages.list does by default
+_HIDDEN_LABELS = {'SPAM', 'TRASH'}
+
+# Gmail quota budgets in quota units per second, per Gmail user (mailbox) and for the whole app.
+# Every app user shares the mailbox in token.pickle, so they share its budget too.
+USER_QUOTA_PER_SECOND = float(os.getenv('GMAIL_USER_QUOTA_PER_SECOND', '250'))
+GLOBAL_QUOTA_PER_SECOND = float(os.getenv('GMAIL_GLOBAL_QUOTA_PER_SECOND', '20000'))
+GMAIL_MAX_RETRIES = int(os.getenv('GMAIL_MAX_RETRIES', '5'))
+# Longest Retry-After waited out, in seconds; longer waits are passed to the client as a 429
+GMAIL_MAX_RETRY_AFTER = float(os.getenv('GMAIL_MAX_RETRY_AFTER', '30'))
+
+# Quota units charged by Gmail per method
+QUOTA_UNITS = {
+    'messages.get': 5,
+    'messages.list': 5,
+    'attachments.get': 5,
+    'history.list': 2,
+    'getProfile': 1,
+}
+
+# Call priorities: background work yields to interactive requests
+INTERACTIVE = 0
+BACKGROUND = 1
+
+class GmailRateLimitError(Exception):
+    """Gmail kept rejecting a call for exceeding its quota."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out reservations.
+
+    Taking more tokens than are available drives the balance negative; the
+    caller is told how long to wait, so reservations are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, units: float) -> float:
+        """Take units from the bucket and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= units
+            return max(-self._tokens / self.rate, 0.0)
+
+class GmailScheduler:
+    """Central admission control for Gmail API calls.
+
+    Every call takes quota units from a global bucket and from the bucket of
+    the Gmail mailbox it is made against; Gmail's per-user limit applies to
+    the mailbox, whichever app user caused the call. Background calls wait
+    while interactive calls are queued, and throttled or failed calls are
+    retried with jittered exponential backoff. A call that would have to wait
+    longer than max_retry_after is not retried, so a long Retry-After cannot
+    park every worker.
+    """
+
+    def __init__(
+        self,
+        user_rate: float = USER_QUOTA_PER_SECOND,
+        global_rate: float = GLOBAL_QUOTA_PER_SECOND,
+        max_retries: int = GMAIL_MAX_RETRIES,
+        max_retry_after: float = GMAIL_MAX_RETRY_AFTER
+    ):
+        self.user_rate = user_rate
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._global_bucket = TokenBucket(global_rate)
+        self._mailbox_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._interactive_waiting = 0
+
+    def acquire(self, units: float, mailbox: str, priority: int = INTERACTIVE) -> None:
+        """Block until units may be spent on mailbox."""
+        if priority == BACKGROUND:
+            while self._interactive_waiting:
+                time.sleep(0.05)
+        
+        with self._lock:
+            if mailbox not in self._mailbox_buckets:
+                self._mailbox_buckets[mailbox] = TokenBucket(self.user_rate)
+            mailbox_bucket = self._mailbox_buckets[mailbox]
+            if priority == INTERACTIVE:
+                self._interactive_waiting += 1
+        try:
+            wait = max(self._global_bucket.reserve(units), mailbox_bucket.reserve(units))
+            if wait:
+                time.sleep(wait)
+        finally:
+            if priority == INTERACTIVE:
+                with self._lock:
+                    self._interactive_waiting -= 1
+
+    def execute(self, request, units: float):
+        """Execute a googleapiclient request within its mailbox's budget, retrying throttled calls."""
+        mailbox, priority = _service_holder.mailbox, _gmail_priority.get()
+        for attempt in range(self.max_retries + 1):
+            self.acquire(units, mailbox, priority)
+            try:
+                return request.execute()
+            except HttpError as e:
+                if not is_retryable(e):
+                    raise
+                delay = retry_after_seconds(e, attempt)
+                if attempt == self.max_retries or delay > self.max_retry_after:
+                    if is_rate_limited(e):
+                        raise GmailRateLimitError(str(e), delay) from e
+                    raise
+                time.sleep(delay)
+
+def is_rate_limited(error: HttpError) -> bool:
+    """Whether Gmail rejected a call for exceeding a rate limit."""
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and b'ratelimitexceeded' in (error.content or b'').lower()
+
+def is_retryable(error: HttpError) -> bool:
+    """Whether a failed call may succeed when retried."""
+    return is_rate_limited(error) or error.resp.status >= 500
+
+def backoff_seconds(attempt: int, base: float = 0.5, cap: float = 32.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def retry_after_seconds(error: HttpError, attempt: int) -> float:
+    """Delay before retrying, honouring a Retry-After header when Gmail sends one."""
+    retry_after = error.resp.get('retry-after')
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return backoff_seconds(attempt)
+
+# Priority of Gmail calls made in the current context
+_gmail_priority: contextvars.ContextVar[int] = contextvars.ContextVar('gmail_priority', default=INTERACTIVE)
+
+scheduler = GmailScheduler()
+
+# Access tokens are refreshed this long before they actually expire
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+class GmailServiceHolder:
+    """Long-lived holder for Gmail credentials and API clients.
+
+    Credentials are loaded once and refreshed under a lock shortly before
+    they expire; the token file is only rewritten when the credentials
+    change. googleapiclient service objects are not thread-safe, so each
+    thread builds its own client once and reuses it.
+    """
+
+    def __init__(self, token_path: str = 'token.pickle', credentials_path: str = 'credentials.json'):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self._creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def mailbox(self) -> str:
+        """Key of the Gmail mailbox the clients act on; a token file holds one account's credentials."""
+        return os.path.abspath(self.token_path)
+
+    def get_service(self):
+        """Get the Gmail client for the current thread."""
+        creds = self.get_credentials()
+        service = getattr(self._local, 'service', None)
+        if service is None or self._local.creds is not creds:
+            service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
+            self._local.service = service
+            self._local.creds = creds
+        return service
+
+    def get_credentials(self):
+        """Get valid credentials, refreshing them if they are about to expire."""
+        creds = self._creds
+        if creds is not None and not self._needs_refresh(creds):
+            return creds
+        
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load_credentials()
+            if self._needs_refresh(self._creds):
+                self._refresh(self._creds)
+            return self._creds
+
+    def _needs_refresh(self, creds) -> bool:
+        if not creds.valid:
+            return True
+        # Credentials expiry is a naive UTC datetime
+        return creds.expiry is not None and creds.expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN
+
+    def _load_credentials(self):
+        # Load existing credentials if available
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+            if creds and (creds.valid or creds.refresh_token):
+                return creds
+        
+        flow = InstalledAppFlow.from_client_secrets_file(
+            self.credentials_path, SCOPES)
+        flow.redirect_uri = 'http://localhost:8080/'
+        creds = flow.run_local_server(port=8080)
+        self._save_credentials(creds)
+        return creds
+
+    def _refresh(self, creds) -> None:
+        previous_token = creds.token
+        creds.refresh(Request())
+        if creds.token != previous_token:
+            self._save_credentials(creds)
+
+    def _save_credentials(self, creds) -> None:
+        # Write to a temporary file first so a crash never leaves a truncated token file
+        tmp_path = self.token_path + '.tmp'
+        with open(tmp_path, 'wb') as token:
             pickle.dump(creds, token)
+        os.replace(tmp_path, self.token_path)
 
-    return build('gmail', 'v1', credentials=creds)
+_service_holder = GmailServiceHolder()
 
-def get_email_data(service, message_id: str) -> Dict[str, Any]:
-    """Get detailed email data."""
-    message = service.users().messages().get(
+def get_gmail_service():
+    """Get authenticated Gmail service."""
+    return _service_holder.get_service()
+
+def _message_request(service, message_id: str, metadata_only: bool = False):
+    """Build a messages.get request, optionally limited to listing metadata."""
+    if metadata_only:
+        return service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='full',
+            fields=METADATA_FIELDS
+        )
+    return service.users().messages().get(
         userId='me', 
         id=message_id, 
         format='full'
-    ).execute()
-    
-    # Extract headers
-    headers = message['payload']['headers']
-    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-    sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown')
-    date = next((h['value'] for h in headers if h['name'].lower() == 'date'), '')
-    
-    # Parse and format date
-    try:
-        timestamp = datetime.strptime(date, '%a, %d %b %Y %H:%M:%S %z')
-        formatted_date = timestamp.strftime('%B %d, %Y %I:%M %p')
-    except:
-        timestamp = datetime.now()
-        formatted_date = timestamp.strftime('%B %d, %Y %I:%M %p')
-    
-    # Get attachments
-    attachments = []
-    if 'parts' in message['payload']:
-        for part in message['payload']['parts']:
-            if part.get('filename'):
-                attachment = {
-                    'id': part['body'].get('attachmentId'),
-                    'filename': part['filename'],
-                    'mimeType': part['mimeType']
-                }
-                attachments.append(attachment)
+    )
+
+def get_email_data(service, message_id: str, metadata_only: bool = False) -> Dict[str, Any]:
+    """Get detailed email data."""
+    message = scheduler.execute(
+        _message_request(service, message_id, metadata_only), QUOTA_UNITS['messages.get']
+    )
     
-    return {
-        'sender': sender,
-        'subject': subject,
-        'timestamp': formatted_date,
-        'attachments': attachments
-    }
+    return message_parser.parse_message(message)
+
+def get_email_data_batch(
+    service,
+    message_ids: List[str],
+    batch_size: int = BATCH_SIZE,
+    metadata_only: bool = False
+) -> List[Dict[str, Any]]:
+    """Get detailed email data for several messages using Gmail batch requests."""
+    messages = get_messages_batch(service, message_ids, batch_size, metadata_only)
+    return [message_parser.parse_message(message) for message in messages]
+
+def get_messages_batch(
+    service,
+    message_ids: List[str],
+    batch_size: int = BATCH_SIZE,
+    metadata_only: bool = False
+) -> List[Dict[str, Any]]:
+    """Get raw Gmail message resources using batch requests, in the order requested.
+
+    Messages that fail permanently (e.g. deleted meanwhile) are skipped.
+    Throttled messages are retried in later rounds; if some are still
+    throttled after the last round, or Gmail asks for a longer wait than
+    the scheduler allows, GmailRateLimitError is raised rather than
+    returning a partial result.
+    """
+    results = {}
+    throttled: Dict[str, HttpError] = {}
+
+    def handle_response(request_id, response, exception):
+        # A failed message is skipped without affecting the rest of the batch;
+        # throttled ones are collected for another round
+        if exception is None:
+            results[request_id] = response
+        elif isinstance(exception, HttpError) and is_retryable(exception):
+            throttled[request_id] = exception
+
+    for start in range(0, len(message_ids), batch_size):
+        pending = message_ids[start:start + batch_size]
+        for attempt in range(scheduler.max_retries + 1):
+            throttled = {}
+            batch = service.new_batch_http_request(callback=handle_response)
+            for message_id in pending:
+                batch.add(_message_request(service, message_id, metadata_only), request_id=message_id)
+            scheduler.execute(batch, QUOTA_UNITS['messages.get'] * len(pending))
+            if not throttled:
+                break
+            pending = list(throttled)
+            delay = max(retry_after_seconds(e, attempt) for e in throttled.values())
+            if attempt == scheduler.max_retries or delay > scheduler.max_retry_after:
+                break
+            time.sleep(delay)
+
+        if throttled:
+            if not any(is_rate_limited(e) for e in throttled.values()):
+                raise next(iter(throttled.values()))
+            raise GmailRateLimitError(f'{len(throttled)} messages are still rate limited', delay)
+
+    return [results[message_id] for message_id in message_ids if message_id in results]
 
 def download_attachment(service, message_id: str, attachment_id: str) -> bytes:
     """Download email attachment."""
-    attachment = service.users().messages().attachments().get(
-        userId='me',
-        messageId=message_id,
-        id=attachment_id
-    ).execute()
+    return base64.urlsafe_b64decode(get_attachment_data(service, message_id, attachment_id))
+
+def get_attachment_data(service, message_id: str, attachment_id: str) -> str:
+    """Download email attachment as the base64url string returned by Gmail.
+
+    attachments.get has no streaming body, so the whole encoded attachment
+    (4/3 of its size) is held in memory until the caller has decoded it.
+    """
+    attachment = scheduler.execute(
+        service.users().messages().attachments().get(
+            userId='me',
+            messageId=message_id,
+            id=attachment_id
+        ),
+        QUOTA_UNITS['attachments.get']
+    )
     
-    return base64.urlsafe_b64decode(attachment['data'])
+    return attachment['data']
 
-def fetch_emails(service, max_results: int = 10) -> List[Dict[str, Any]]:
-    """Fetch list of emails."""
-    results = service.users().messages().list(
-        userId='me', 
-        maxResults=max_results
-    ).execute()
-    messages = results.get('messages', [])
+def iter_decoded(data: str, chunk_size: int = ATTACHMENT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Decode base64url data incrementally, yielding chunks of up to chunk_size bytes."""
+    # Every 4 encoded characters decode to 3 bytes, so chunks are cut on 4-character boundaries
+    step = max(chunk_size // 3, 1) * 4
+    for start in range(0, len(data), step):
+        chunk = data[start:start + step]
+        yield base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))
+
+def fetch_emails(
+    service,
+    max_results: int = 10,
+    batch_size: int = BATCH_SIZE,
+    metadata_only: bool = False,
+    service_factory: Optional[Callable[[], Any]] = None
+) -> List[Dict[str, Any]]:
+    """Fetch list of emails.
+
+    Message details are fetched with Gmail batch requests of up to
+    ``batch_size`` messages; a ``batch_size`` of 1 fetches them one by one.
+    With ``metadata_only`` only headers and the attachment part structure
+    are requested, leaving message bodies on the server.
+    """
+    pages = iter_email_pages(service, max_results, batch_size, metadata_only, service_factory)
+    return [email for page in pages for email in page]
+
+def iter_email_pages(
+    service,
+    max_results: int = 10,
+    batch_size: int = BATCH_SIZE,
+    metadata_only: bool = False,
+    service_factory: Optional[Callable[[], Any]] = None,
+    window: int = PAGE_WINDOW
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield emails one listing page at a time, following nextPageToken.
+
+    When ``service_factory`` is given, listing runs on the listing pool with
+    its own client and stays up to ``window`` pages ahead, so the next page
+    is listed while the details of the current one are fetched. The factory
+    is also called for every page, so a generator that is resumed on
+    different threads always uses the current thread's client.
+    """
+    if service_factory is None:
+        pages = _list_message_pages(service, max_results)
+    else:
+        pages = _prefetch_pages(lambda *args: _list_page(service_factory(), *args), max_results, window)
     
-    return [get_email_data(service, message['id']) for message in messages]
+    try:
+        for message_ids in pages:
+            page_service = service if service_factory is None else service_factory()
+            if batch_size > 1:
+                yield get_email_data_batch(page_service, message_ids, batch_size, metadata_only)
+            else:
+                yield [get_email_data(page_service, message_id, metadata_only) for message_id in message_ids]
+    finally:
+        pages.close()
+
+def _list_page(service, page_token: Optional[str], remaining: int) -> Tuple[List[str], Optional[str]]:
+    """List up to remaining message ids from one page and return them with the next page token."""
+    results = scheduler.execute(
+        service.users().messages().list(
+            userId='me', 
+            maxResults=min(LIST_PAGE_SIZE, remaining),
+            pageToken=page_token
+        ),
+        QUOTA_UNITS['messages.list']
+    )
+    message_ids = [message['id'] for message in results.get('messages', [])][:remaining]
+    return message_ids, results.get('nextPageToken')
+
+def _list_message_pages(service, max_results: int) -> Iterator[List[str]]:
+    """Yield message ids page by page until max_results ids have been listed."""
+    remaining = max_results
+    page_token = None
+    while remaining > 0:
+        message_ids, page_token = _list_page(service, page_token, remaining)
+        if message_ids:
+            yield message_ids
+        remaining -= len(message_ids)
+        if not page_token:
+            break
+
+def _prefetch_pages(
+    list_page: Callable[[Optional[str], int], Tuple[List[str], Optional[str]]],
+    max_results: int,
+    window: int
+) -> Iterator[List[str]]:
+    """Yield listing pages, listing up to window pages ahead on the listing pool.
+
+    Every page is a separate task, submitted when the previous page arrives
+    while fewer than window pages are buffered, or else when the consumer
+    takes one. No pool thread ever waits for the consumer, so an abandoned
+    or stalled stream cannot hold on to a listing thread.
+    """
+    context = contextvars.copy_context()
+    ready = threading.Condition()
+    buffered: collections.deque = collections.deque()
+    state = {'next': (None, max_results), 'running': None, 'stopped': False}
+
+    def submit():
+        # Called with ready held; the next page's token comes from the previous page
+        page_token, remaining = state['next']
+        state['next'] = None
+        state['running'] = _listing_executor.submit(context.copy().run, list_page, page_token, remaining)
+        state['running'].add_done_callback(lambda future: arrived(future, remaining))
+
+    def arrived(future, remaining: int):
+        with ready:
+            state['running'] = None
+            if state['stopped'] or future.cancelled():
+                return
+            try:
+                message_ids, page_token = future.result()
+            except Exception as e:
+                buffered.append((_END, e))
+            else:
+                if message_ids:
+                    buffered.append((message_ids, None))
+                remaining -= len(message_ids)
+                if page_token and remaining > 0:
+                    state['next'] = (page_token, remaining)
+                    if len(buffered) < window:
+                        submit()
+                else:
+                    buffered.append((_END, None))
+            ready.notify()
+
+    try:
+        with ready:
+            submit()
+        while True:
+            with ready:
+                # Only waits on a listing call in flight, which finishes on its own
+                while not buffered:
+                    ready.wait()
+                item, error = buffered.popleft()
+                if state['next'] is not None and state['running'] is None:
+                    submit()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        with ready:
+            state['stopped'] = True
+            if state['running'] is not None:
+                state['running'].cancel()
 
 def get_email_with_attachment(service, message_id: str, attachment_id: str) -> Dict[str, Any]:
     """Get email with attachment data."""
@@ -104,4 +543,231 @@ def get_email_with_attachment(service, message_id: str, attachment_id: str) -> D
     return {
         **email_data,
         'attachment_data': base64.b64encode(attachment_data).decode('utf-8')
-    } 
\ No newline at end of file
+    }
+
+# Local message store kept in sync through the Gmail history API
+_sync_lock = threading.Lock()
+_last_sync = 0.0
+_account = None
+
+def get_account(service) -> str:
+    """Get the email address of the authenticated Gmail account."""
+    global _account
+    if _account is None:
+        profile = scheduler.execute(service.users().getProfile(userId='me'), QUOTA_UNITS['getProfile'])
+        _account = profile['emailAddress']
+    return _account
+
+def sync_mailbox(service, db: Session) -> str:
+    """Bring the local message store up to date and return the synced account.
+
+    The first sync stores the most recent SYNC_INITIAL_MESSAGES messages;
+    later syncs apply only the changes since the stored history cursor.
+    """
+    global _last_sync
+    with _sync_lock:
+        profile = scheduler.execute(service.users().getProfile(userId='me'), QUOTA_UNITS['getProfile'])
+        account = profile['emailAddress']
+        state = db.get(models.MailboxSyncState, account)
+        
+        if state is None:
+            state = models.MailboxSyncState(account=account)
+            db.add(state)
+            _full_sync(service, db, state, profile['historyId'])
+        else:
+            try:
+                _history_sync(service, db, state)
+            except HttpError as e:
+                # The cursor is too old for the history API; start over
+                if e.resp.status != 404:
+                    raise
+                _full_sync(service, db, state, profile['historyId'])
+        
+        state.synced_at = datetime.now()
+        db.commit()
+        _last_sync = time.monotonic()
+        return account
+
+def _full_sync(service, db: Session, state, history_id: str) -> None:
+    # The cursor is taken before listing so changes made meanwhile are replayed next time
+    db.query(models.StoredEmail).filter(models.StoredEmail.account == state.account).delete()
+    
+    for message_ids in _list_message_pages(service, SYNC_INITIAL_MESSAGES):
+        _store_messages(service, db, state.account, message_ids)
+    state.history_id = history_id
+
+def _history_sync(service, db: Session, state) -> None:
+    added, removed = {}, set()
+    history_id = state.history_id
+    page_token = None
+    
+    while True:
+        results = scheduler.execute(
+            service.users().history().list(
+                userId='me',
+                startHistoryId=state.history_id,
+                historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                pageToken=page_token
+            ),
+            QUOTA_UNITS['history.list']
+        )
+        
+        # Records are in chronological order, so later changes override earlier ones
+        for record in results.get('history', []):
+            for change in record.get('messagesAdded', []) + record.get('labelsRemoved', []):
+                message = change['message']
+                if _HIDDEN_LABELS.isdisjoint(message.get('labelIds', [])):
+                    added[message['id']] = True
+                    removed.discard(message['id'])
+            for change in record.get('labelsAdded', []):
+                if not _HIDDEN_LABELS.isdisjoint(change.get('labelIds', [])):
+                    added.pop(change['message']['id'], None)
+                    removed.add(change['message']['id'])
+            for change in record.get('messagesDeleted', []):
+                added.pop(change['message']['id'], None)
+                removed.add(change['message']['id'])
+        
+        history_id = results.get('historyId', history_id)
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    
+    if removed:
+        db.query(models.StoredEmail).filter(
+            models.StoredEmail.account == state.account,
+            models.StoredEmail.message_id.in_(removed)
+        ).delete(synchronize_session=False)
+    _store_messages(service, db, state.account, list(added))
+    state.history_id = history_id
+
+def _store_messages(service, db: Session, account: str, message_ids: List[str]) -> None:
+    for message in get_messages_batch(service, message_ids, metadata_only=True):
+        db.merge(models.StoredEmail(
+            account=account,
+            message_id=message['id'],
+            internal_date=int(message.get('internalDate', 0)),
+            data=json.dumps(message_parser.parse_message(message))
+        ))
+
+def get_stored_emails(db: Session, account: str, max_results: int = 10) -> List[Dict[str, Any]]:
+    """Get the most recent emails from the local message store."""
+    rows = db.query(models.StoredEmail.data).filter(
+        models.StoredEmail.account == account
+    ).order_by(models.StoredEmail.internal_date.desc()).limit(max_results).all()
+    return [json.loads(row.data) for row in rows]
+
+def _read_store(service, max_results: int) -> List[Dict[str, Any]]:
+    db = database.SessionLocal()
+    try:
+        account = get_account(service)
+        if db.get(models.MailboxSyncState, account) is None:
+            sync_mailbox(service, db)
+        return get_stored_emails(db, account, max_results)
+    finally:
+        db.close()
+
+def _background_sync(service) -> None:
+    # Skip when a sync is already running or one finished recently
+    if time.monotonic() - _last_sync < SYNC_INTERVAL or _sync_lock.locked():
+        return
+    db = database.SessionLocal()
+    try:
+        sync_mailbox(service, db)
+    finally:
+        db.close()
+
+# Async API: the blocking googleapiclient stack runs on a bounded worker pool
+_executor = ThreadPoolExecutor(max_workers=GMAIL_WORKERS, thread_name_prefix='gmail')
+_pending_calls = asyncio.Semaphore(GMAIL_MAX_PENDING)
+
+# Listing threads for pipelined pagination, kept apart so they never wait on _executor
+_listing_executor = ThreadPoolExecutor(max_workers=GMAIL_WORKERS, thread_name_prefix='gmail-list')
+_END = object()
+
+def _call_with_service(func, *args):
+    # Clients are per thread, so the service is looked up on the worker thread
+    return func(get_gmail_service(), *args)
+
+async def _run_blocking(func, *args, priority: int = INTERACTIVE):
+    # The worker runs in a copy of this context so the scheduler sees the priority
+    context = contextvars.copy_context()
+    context.run(_gmail_priority.set, priority)
+    with instrumentation.span('gmail'):
+        async with _pending_calls:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_executor, context.run, functools.partial(func, *args))
+
+async def run_gmail_call(func, *args, priority: int = INTERACTIVE):
+    """Run a blocking Gmail call on the worker pool.
+
+    Callers wait for a free slot once GMAIL_MAX_PENDING calls are in flight,
+    so a burst of requests cannot grow the executor queue without bound.
+    Quota is charged to the mailbox at the given priority.
+    """
+    return await _run_blocking(_call_with_service, func, *args, priority=priority)
+
+async def fetch_emails_async(
+    max_results: int = 10,
+    batch_size: int = BATCH_SIZE,
+    metadata_only: bool = False
+) -> List[Dict[str, Any]]:
+    """Fetch list of emails without blocking the event loop."""
+    return await run_gmail_call(
+        fetch_emails, max_results, batch_size, metadata_only, get_gmail_service
+    )
+
+async def iter_emails_async(
+    max_results: int = 10,
+    batch_size: int = BATCH_SIZE,
+    metadata_only: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield emails as soon as each listing page has been fetched."""
+    pages = await run_gmail_call(
+        iter_email_pages, max_results, batch_size, metadata_only, get_gmail_service
+    )
+    fetching = None
+    try:
+        while True:
+            # Shielded, so cancelling the stream leaves the running next() to finish
+            fetching = asyncio.ensure_future(_run_blocking(next, pages, _END))
+            page = await asyncio.shield(fetching)
+            if page is _END:
+                break
+            for email in page:
+                yield email
+    finally:
+        await asyncio.shield(_close_pages(pages, fetching))
+
+async def _close_pages(pages, fetching: Optional[asyncio.Future]) -> None:
+    # A generator cannot be closed while another thread is running it
+    if fetching is not None:
+        await asyncio.gather(fetching, return_exceptions=True)
+    await _run_blocking(pages.close)
+
+async def get_stored_emails_async(max_results: int = 10) -> List[Dict[str, Any]]:
+    """Get emails from the local message store, running the initial sync if needed."""
+    return await run_gmail_call(_read_store, max_results)
+
+async def sync_mailbox_async() -> None:
+    """Refresh the local message store unless it was synced recently."""
+    await run_gmail_call(_background_sync, priority=BACKGROUND)
+
+async def get_email_data_async(
+    message_id: str,
+    metadata_only: bool = False
+) -> Dict[str, Any]:
+    """Get detailed email data without blocking the event loop."""
+    return await run_gmail_call(get_email_data, message_id, metadata_only)
+
+async def download_attachment_async(message_id: str, attachment_id: str) -> bytes:
+    """Download email attachment without blocking the event loop."""
+    return await run_gmail_call(download_attachment, message_id, attachment_id)
+
+async def get_attachment_data_async(message_id: str, attachment_id: str) -> str:
+    """Download email attachment as base64url data without blocking the event loop."""
+    return await run_gmail_call(get_attachment_data, message_id, attachment_id)
+
+def shutdown() -> None:
+    """Stop the Gmail worker pool."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _listing_executor.shutdown(wait=False, cancel_futures=True)
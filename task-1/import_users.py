@@ -0,0 +1,42 @@
+"""Bulk-import users from a CSV or JSON Lines file.
+
+Each record needs ``email``, ``name`` and ``password`` fields:
+
+    python import_users.py users.csv
+    python import_users.py users.jsonl
+"""
+import argparse
+import asyncio
+import csv
+import json
+from typing import List
+import auth, crud, models, schemas
+from database import AsyncSessionLocal, engine
+
+def read_users(path: str) -> List[schemas.UserCreate]:
+    """Read user records from a .csv or .jsonl file."""
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            records = list(csv.DictReader(file))
+        else:
+            records = [json.loads(line) for line in file if line.strip()]
+    return [schemas.UserCreate(**record) for record in records]
+
+async def hash_in_processes(passwords: List[str]) -> List[str]:
+    """Hash passwords in worker processes, using every core for an offline import."""
+    return await asyncio.to_thread(auth.hash_passwords, passwords)
+
+async def import_users(path: str) -> schemas.UserImportResult:
+    """Import users from a file into the database."""
+    users = read_users(path)
+    async with AsyncSessionLocal() as db:
+        return await crud.bulk_create_users(db, users, hash_passwords=hash_in_processes)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import users from a CSV or JSON Lines file.")
+    parser.add_argument("path", help="CSV file with a header row, or JSON Lines file")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    result = asyncio.run(import_users(args.path))
+    print(f"Created {result.created} users, skipped {len(result.skipped)} already registered")
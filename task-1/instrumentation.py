@@ -0,0 +1,158 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Time spent per stage (db, gmail, hash, encode) in the current request
+_request_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_spans", default=None)
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus model."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+class MetricsRegistry:
+    """Per-endpoint request and stage latency histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, str], Histogram] = {}
+        self._stages: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def observe_request(self, handler: str, method: str, status: int, duration: float, spans: Dict[str, float]) -> None:
+        with self._lock:
+            key = (handler, method, str(status))
+            if key not in self._requests:
+                self._requests[key] = Histogram()
+            self._requests[key].observe(duration)
+            for stage, stage_duration in spans.items():
+                if (handler, stage) not in self._stages:
+                    self._stages[(handler, stage)] = Histogram()
+                self._stages[(handler, stage)].observe(stage_duration)
+
+    def register_counter(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        """Expose a counter whose value is read when metrics are rendered."""
+        self._counters.append((name, help_text, read))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by handler.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (handler, method, status), histogram in sorted(self._requests.items()):
+                labels = f'handler="{handler}",method="{method}",status="{status}"'
+                lines.extend(histogram.render("http_request_duration_seconds", labels))
+            lines += [
+                "# HELP request_stage_duration_seconds Time per request spent in each stage.",
+                "# TYPE request_stage_duration_seconds histogram",
+            ]
+            for (handler, stage), histogram in sorted(self._stages.items()):
+                labels = f'handler="{handler}",stage="{stage}"'
+                lines.extend(histogram.render("request_stage_duration_seconds", labels))
+        for name, help_text, read in self._counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {read()}"]
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's stage total."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = _request_spans.get()
+        if spans is not None:
+            spans[stage] = spans.get(stage, 0.0) + time.perf_counter() - start
+
+def instrument_engine(engine) -> None:
+    """Record statement execution time of a SQLAlchemy engine as the db stage."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _record_query(conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute never runs for a failed statement, so its start is dropped here
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts:
+            _record_query(starts.pop())
+
+def _record_query(start: float) -> None:
+    spans = _request_spans.get()
+    if spans is not None:
+        spans["db"] = spans.get("db", 0.0) + time.perf_counter() - start
+
+class InstrumentationMiddleware:
+    """ASGI middleware recording request latency and stage spans.
+
+    Stage totals are sent in a ``Server-Timing`` header and aggregated into
+    histograms labelled with the endpoint function name.
+    """
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: Dict[str, float] = {}
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = ", ".join(
+                    [f"{stage};dur={duration * 1000:.2f}" for stage, duration in spans.items()]
+                    + [f"total;dur={(time.perf_counter() - start) * 1000:.2f}"]
+                )
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            self.registry.observe_request(handler, scope["method"], status, time.perf_counter() - start, spans)
@@ -1,39 +1,82 @@
 from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 import crud, models, schemas, auth
-from database import engine, get_db
-from middleware import add_cors_middleware, add_security_middleware
+from database import engine, async_engine, get_db
+from middleware import add_cors_middleware, add_security_middleware, add_instrumentation_middleware
 import os
 import uvicorn
 import email_service
-import io
-import base64
-from typing import List, Dict, Any
+import asyncio
+import itertools
+import orjson
+import attachment_cache
+import response_cache
+import instrumentation
+from typing import List, Optional
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop application-wide resources."""
+    last_login_flusher = asyncio.create_task(crud.run_last_login_flusher())
+    yield
+    # Cancelling the flusher writes any pending last_login updates
+    last_login_flusher.cancel()
+    await asyncio.gather(last_login_flusher, return_exceptions=True)
+    email_service.shutdown()
+    auth.shutdown()
+    await async_engine.dispose()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Email Management System",
     description="API for managing emails and user authentication",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# On-disk cache for downloaded attachments
+attachments = attachment_cache.AttachmentCache()
+
+# Per-user cache for email listing and detail responses
+email_cache = response_cache.ResponseCache(response_cache.MemoryLRUBackend())
+
 # Add middleware
 add_cors_middleware(app)
 add_security_middleware(app)
+# Added last so its timings cover the other middleware too
+add_instrumentation_middleware(app)
+
+# Record database time and auth cache activity in the metrics
+instrumentation.instrument_engine(async_engine.sync_engine)
+instrumentation.metrics.register_counter(
+    "auth_token_cache_hits_total", "Access tokens resolved from the cache.", lambda: auth.token_cache.hits
+)
+instrumentation.metrics.register_counter(
+    "auth_token_cache_misses_total", "Access tokens verified against the database.", lambda: auth.token_cache.misses
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose request metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        instrumentation.metrics.render(),
+        media_type="text/plain; version=0.0.4"
+    )
 
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Authenticate user and return access token."""
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await crud.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,77 +91,217 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/logout")
-async def logout(current_user: schemas.User = Depends(auth.get_current_user)):
+async def logout(
+    current_user: schemas.User = Depends(auth.get_current_user),
+    token: str = Depends(auth.oauth2_scheme)
+):
     """Logout user."""
+    auth.revoke_token(token)
     return {"message": "Logged out successfully"}
 
 @app.post("/users", response_model=schemas.User)
 async def register_user(
     user: schemas.UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Register new user."""
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
+    db_user = await crud.create_user(db=db, user=user)
+    if db_user is None:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return db_user
+
+@app.get("/users", response_model=schemas.UserPage)
+async def list_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_user)
+):
+    """List users ordered by id, one page per cursor."""
+    try:
+        after_id = crud.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if stream:
+        return StreamingResponse(_stream_users(db, after_id), media_type="application/x-ndjson")
+    
+    rows = await crud.list_users(db, after_id, limit)
+    next_cursor = crud.encode_cursor(rows[-1].id) if len(rows) == limit else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+async def _stream_users(db: AsyncSession, after_id: Optional[int]):
+    """Yield users as newline-delimited JSON."""
+    async for row in crud.stream_users(db, after_id):
+        yield schemas.User.model_validate(row).model_dump_json() + "\n"
+
+@app.post("/users/bulk", response_model=schemas.UserImportResult)
+async def import_users(
+    users: List[schemas.UserCreate],
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.User = Depends(auth.get_current_user)
+):
+    """Register many users at once, skipping already registered emails.
+
+    Requests are limited to BULK_INSERT_CHUNK_SIZE users, since every
+    password is hashed while the request is open; larger imports belong
+    in import_users.py.
+    """
+    if len(users) > crud.BULK_INSERT_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {crud.BULK_INSERT_CHUNK_SIZE} users per request; "
+                   "import larger files with import_users.py"
+        )
+    return await crud.bulk_create_users(db, users)
 
-@app.get("/emails", response_model=List[Dict[str, Any]])
+def _rate_limit_exception(error: email_service.GmailRateLimitError) -> HTTPException:
+    """Report Gmail throttling as a 429 the client can retry."""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Gmail rate limit exceeded, please try again later",
+        headers={"Retry-After": str(max(int(error.retry_after), 1))}
+    )
+
+# The email endpoints return pre-serialized responses, so their response models
+# only document the payload and FastAPI's encoder pass is skipped
+@app.get("/emails", response_model=List[schemas.Email], response_class=ORJSONResponse)
 async def get_emails(
-    max_results: int = 10,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    max_results: int = Query(10, ge=1, le=email_service.MAX_RESULTS),
+    batch_size: int = Query(email_service.BATCH_SIZE, ge=1, le=100),
+    metadata_only: bool = False,
+    cached: bool = False,
+    stream: bool = False,
     current_user: schemas.User = Depends(auth.get_current_user)
 ):
-    """Get list of emails."""
+    """Get list of emails.
+
+    Listings of more than MAX_BUFFERED_RESULTS emails from Gmail must be
+    streamed, so they are never held in memory or in the response cache.
+    """
+    if not (stream or cached) and max_results > email_service.MAX_BUFFERED_RESULTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {email_service.MAX_BUFFERED_RESULTS} emails without stream=true"
+        )
     try:
-        service = email_service.get_gmail_service()
-        return email_service.fetch_emails(service, max_results)
+        if stream:
+            return StreamingResponse(
+                _stream_emails(max_results, batch_size, metadata_only),
+                media_type="application/x-ndjson"
+            )
+        if cached:
+            # Serve from the local store and refresh it after the response is sent
+            emails = await email_service.get_stored_emails_async(max_results)
+            background_tasks.add_task(email_service.sync_mailbox_async)
+            with instrumentation.span("encode"):
+                return ORJSONResponse(emails)
+        
+        # batch_size does not change the result, so it is not part of the key
+        entry = await email_cache.get_or_fetch(
+            f"emails:{current_user.email}:{max_results}:{metadata_only}",
+            lambda: email_service.fetch_emails_async(max_results, batch_size, metadata_only)
+        )
+        return email_cache.response(request, entry)
+    except email_service.GmailRateLimitError as e:
+        raise _rate_limit_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/emails/{message_id}")
+async def _stream_emails(max_results: int, batch_size: int, metadata_only: bool):
+    """Yield emails as newline-delimited JSON while later pages are still being fetched."""
+    try:
+        async for email in email_service.iter_emails_async(max_results, batch_size, metadata_only):
+            yield orjson.dumps(email) + b"\n"
+    except Exception as e:
+        # The status line has already been sent, so report the failure in-band
+        yield orjson.dumps({"error": str(e)}) + b"\n"
+
+@app.get("/emails/{message_id}", response_model=schemas.Email, response_class=ORJSONResponse)
 async def get_email(
+    request: Request,
     message_id: str,
     current_user: schemas.User = Depends(auth.get_current_user)
 ):
     """Get specific email details."""
     try:
-        service = email_service.get_gmail_service()
-        return email_service.get_email_data(service, message_id)
+        entry = await email_cache.get_or_fetch(
+            f"email:{current_user.email}:{message_id}",
+            lambda: email_service.get_email_data_async(message_id)
+        )
+        return email_cache.response(request, entry)
+    except email_service.GmailRateLimitError as e:
+        raise _rate_limit_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _get_cached_attachment(
+    message_id: str,
+    attachment_id: str
+) -> attachment_cache.CachedAttachment:
+    """Get an attachment from the disk cache, downloading it from Gmail on a miss.
+
+    The returned entry's file is open, so the response can be sent even if
+    the blob is evicted meanwhile.
+    """
+    entry = await asyncio.to_thread(attachments.get, message_id, attachment_id)
+    if entry is None:
+        attachment_data = await email_service.get_attachment_data_async(message_id, attachment_id)
+        # Decode chunk by chunk straight to disk instead of materializing the whole file
+        entry = await asyncio.to_thread(
+            attachments.put, message_id, attachment_id, email_service.iter_decoded(attachment_data)
+        )
+    return entry
+
 @app.get("/emails/{message_id}/attachments/{attachment_id}")
 async def get_attachment(
+    request: Request,
     message_id: str,
     attachment_id: str,
     current_user: schemas.User = Depends(auth.get_current_user)
 ):
     """Download email attachment."""
     try:
-        service = email_service.get_gmail_service()
-        attachment_data = email_service.download_attachment(service, message_id, attachment_id)
-        
-        return StreamingResponse(
-            io.BytesIO(attachment_data),
-            media_type="application/octet-stream",
+        entry = await _get_cached_attachment(message_id, attachment_id)
+        return attachment_cache.file_response(
+            request,
+            entry,
             headers={"Content-Disposition": f"attachment; filename=attachment_{attachment_id}"}
         )
+    except email_service.GmailRateLimitError as e:
+        raise _rate_limit_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/emails/{message_id}/attachments/{attachment_id}/base64")
 async def get_attachment_base64(
+    request: Request,
     message_id: str,
     attachment_id: str,
     current_user: schemas.User = Depends(auth.get_current_user)
 ):
     """Get email attachment in base64 format."""
     try:
-        service = email_service.get_gmail_service()
-        attachment_data = email_service.download_attachment(service, message_id, attachment_id)
-        base64_data = base64.b64encode(attachment_data).decode('utf-8')
+        entry = await _get_cached_attachment(message_id, attachment_id)
+        response = attachment_cache.not_modified(request, entry, {})
+        if response is not None:
+            return response
         
-        return {"attachment_data": base64_data}
+        # Stream the JSON document so the re-encoded attachment is never held in full
+        return StreamingResponse(
+            itertools.chain(
+                [b'{"attachment_data": "'],
+                attachment_cache.iter_file_base64(entry.file),
+                [b'"}']
+            ),
+            media_type="application/json",
+            headers={"ETag": entry.etag}
+        )
+    except email_service.GmailRateLimitError as e:
+        raise _rate_limit_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
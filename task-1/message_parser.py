@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+# Display format for email timestamps
+TIMESTAMP_FORMAT = '%B %d, %Y %I:%M %p'
+
+# Headers needed for email listings
+LISTING_HEADERS = frozenset(('subject', 'from', 'date'))
+
+def parse_headers(headers: List[Dict[str, str]], names: frozenset = LISTING_HEADERS) -> Dict[str, str]:
+    """Collect the wanted headers in one pass, keyed by lower-cased name.
+
+    The first occurrence of a repeated header wins.
+    """
+    found = {}
+    for header in headers:
+        name = header['name'].lower()
+        if name in names and name not in found:
+            found[name] = header['value']
+            if len(found) == len(names):
+                break
+    return found
+
+def parse_date(value: str) -> Optional[datetime]:
+    """Parse an RFC 2822 Date header, returning None if it cannot be parsed."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def iter_parts(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Walk a MIME part tree depth-first, in document order, including the root."""
+    yield payload
+    for part in payload.get('parts', ()):
+        yield from iter_parts(part)
+
+def parse_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract listing fields from a Gmail message resource."""
+    payload = message['payload']
+    headers = parse_headers(payload.get('headers', ()))
+
+    # Fall back to Gmail's receive time when the Date header is missing or malformed
+    timestamp = parse_date(headers.get('date', ''))
+    if timestamp is None and message.get('internalDate'):
+        timestamp = datetime.fromtimestamp(int(message['internalDate']) / 1000, tz=timezone.utc)
+
+    attachments = [
+        {
+            'id': part.get('body', {}).get('attachmentId'),
+            'filename': part['filename'],
+            'mimeType': part.get('mimeType')
+        }
+        for part in iter_parts(payload)
+        if part.get('filename')
+    ]
+
+    return {
+        'message_id': message.get('id'),
+        'sender': headers.get('from', 'Unknown'),
+        'subject': headers.get('subject', 'No Subject'),
+        'timestamp': timestamp.strftime(TIMESTAMP_FORMAT) if timestamp else '',
+        'attachments': attachments
+    }
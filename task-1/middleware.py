@@ -1,7 +1,7 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from instrumentation import InstrumentationMiddleware
 import os
 
 def add_cors_middleware(app: FastAPI) -> None:
@@ -20,26 +20,51 @@ def add_cors_middleware(app: FastAPI) -> None:
         ],
     )
 
-# Add secure headers middleware
-class SecureHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware to add security headers to all responses."""
+# Security headers added to every response, encoded once at import time
+SECURE_HEADERS = [
+    (name.lower().encode("latin-1"), value.encode("latin-1"))
+    for name, value in {
+        "X-Content-Type-Options": "nosniff",
+        "X-Frame-Options": "DENY",
+        "X-XSS-Protection": "1; mode=block",
+        "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+        "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+        "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
+    }.items()
+]
+_SECURE_HEADER_NAMES = frozenset(name for name, _ in SECURE_HEADERS)
+
+class SecureHeadersMiddleware:
+    """ASGI middleware to add security headers to all responses.
+
+    Headers are appended to the ``http.response.start`` message directly,
+    so response bodies (including streaming ones) pass through untouched.
+    """
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Add security headers
-        response.headers.update({
-            "X-Content-Type-Options": "nosniff",
-            "X-Frame-Options": "DENY",
-            "X-XSS-Protection": "1; mode=block",
-            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
-            "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';",
-            "Referrer-Policy": "strict-origin-when-cross-origin",
-            "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
-        })
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                if any(name in _SECURE_HEADER_NAMES for name, _ in headers):
+                    # Our values replace any the application set itself
+                    headers = [h for h in headers if h[0] not in _SECURE_HEADER_NAMES]
+                message["headers"] = [*headers, *SECURE_HEADERS]
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_headers)
 
 def add_security_middleware(app: FastAPI) -> None:
     """Add security middleware to the FastAPI application."""
-    app.add_middleware(SecureHeadersMiddleware)
\ No newline at end of file
+    app.add_middleware(SecureHeadersMiddleware)
+
+def add_instrumentation_middleware(app: FastAPI) -> None:
+    """Add request timing middleware to the FastAPI application."""
+    app.add_middleware(InstrumentationMiddleware)
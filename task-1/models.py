@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, DateTime, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -14,3 +14,20 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.now)
     last_login = Column(DateTime, nullable=True)
+
+class StoredEmail(Base):
+    """Gmail message listing data kept in the local message store."""
+    __tablename__ = "stored_emails"
+
+    account = Column(String(255), primary_key=True)
+    message_id = Column(String(64), primary_key=True)
+    internal_date = Column(BigInteger, index=True)
+    data = Column(Text, nullable=False)  # JSON-encoded listing entry
+
+class MailboxSyncState(Base):
+    """History sync cursor for a Gmail account."""
+    __tablename__ = "mailbox_sync_state"
+
+    account = Column(String(255), primary_key=True)
+    history_id = Column(String(32))
+    synced_at = Column(DateTime, nullable=True)
@@ -0,0 +1,150 @@
+import os
+import time
+import asyncio
+import hashlib
+import functools
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import Request
+from starlette.responses import Response
+from dotenv import load_dotenv
+import orjson
+import instrumentation
+
+# Load environment variables
+load_dotenv()
+
+# Cache configuration
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Serialized response body with its validators."""
+    body: bytes
+    etag: str
+    last_modified: float  # Unix timestamp
+
+class CacheBackend(ABC):
+    """Storage interface for cached responses.
+
+    Values are plain bytes plus validators, so a shared store such as Redis
+    can implement this interface as well as the in-process backend.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Get an unexpired entry, or None."""
+
+    @abstractmethod
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        """Store an entry for ttl seconds."""
+
+class MemoryLRUBackend(CacheBackend):
+    """In-process cache backend with LRU eviction."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expiry)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+def serialize_json(content: Any) -> bytes:
+    """Default serializer for cached responses."""
+    return orjson.dumps(content)
+
+class ResponseCache:
+    """TTL response cache with single-flight fetching.
+
+    Concurrent misses for the same key share one upstream fetch; the
+    serialized result is stored in the backend and served with ETag and
+    Last-Modified headers so clients can revalidate with 304 responses.
+
+    The fetch runs in its own task, which callers only shield, so a client
+    disconnecting cancels its own wait but not the fetch the others share.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl: float = RESPONSE_CACHE_TTL,
+        serializer: Callable[[Any], bytes] = serialize_json
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.serializer = serializer
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        """Get a cached response, calling fetch at most once per key on a miss."""
+        cached = await self.backend.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._fetch_done, key))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        content = await fetch()
+        with instrumentation.span("encode"):
+            body = self.serializer(content)
+        entry = CachedResponse(
+            body=body,
+            etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            last_modified=time.time()
+        )
+        await self.backend.set(key, entry, self.ttl)
+        return entry
+
+    def _fetch_done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark a failure as retrieved in case every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def response(self, request: Request, entry: CachedResponse, media_type: str = "application/json") -> Response:
+        """Build the response for a cache entry, or a 304 if the client's copy is current."""
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+        }
+        if self._not_modified(request, entry):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=media_type, headers=headers)
+
+    @staticmethod
+    def _not_modified(request: Request, entry: CachedResponse) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or entry.etag in [t.strip() for t in if_none_match.split(",")]
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= int(entry.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
@@ -1,5 +1,4 @@
 from pydantic import BaseModel
-from datetime import datetime
 from typing import Optional, List
 
 class NoteBase(BaseModel):
@@ -36,6 +35,16 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    """Schema for a page of users."""
+    items: List[User]
+    next_cursor: Optional[str] = None
+
+class UserImportResult(BaseModel):
+    """Schema for bulk user import results."""
+    created: int
+    skipped: List[str]
+
 class Token(BaseModel):
     """Schema for authentication token."""
     access_token: str
@@ -48,16 +57,16 @@ class TokenData(BaseModel):
 # Email schemas
 class Attachment(BaseModel):
     """Schema for email attachment."""
-    id: str
+    id: Optional[str] = None
     filename: str
-    mimeType: str
+    mimeType: Optional[str] = None
 
 class Email(BaseModel):
     """Schema for email."""
     message_id: str
     subject: str
     sender: str
-    timestamp: datetime
+    timestamp: str  # Display format, e.g. "May 01, 2024 09:30 AM"
     attachments: List[Attachment]
 
 class EmailWithAttachment(Email):
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# The app modules are imported as top-level modules, as uvicorn main:app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Settings the modules read at import time
+os.environ.setdefault("DB_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+@pytest.fixture
+def gmail_scheduler(monkeypatch):
+    """Scheduler with effectively unlimited quota and no backoff sleeps."""
+    import email_service
+    scheduler = email_service.GmailScheduler(user_rate=1e9, global_rate=1e9, max_retries=3)
+    monkeypatch.setattr(email_service, "scheduler", scheduler)
+    monkeypatch.setattr(email_service, "backoff_seconds", lambda attempt, **kwargs: 0.0)
+    return scheduler
@@ -0,0 +1,194 @@
+"""In-memory stand-in for the googleapiclient Gmail service."""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+import httplib2
+from googleapiclient.errors import HttpError
+
+def http_error(status: int, reason: str = '', headers: Optional[Dict[str, str]] = None) -> HttpError:
+    """Build an HttpError the way googleapiclient raises it."""
+    response = httplib2.Response({'status': status, **(headers or {})})
+    content = '{"error": {"errors": [{"reason": "%s"}]}}' % reason
+    return HttpError(response, content.encode())
+
+def rate_limit_error(retry_after: Optional[int] = None) -> HttpError:
+    headers = {'retry-after': str(retry_after)} if retry_after is not None else None
+    return http_error(429, 'rateLimitExceeded', headers)
+
+class FakeRequest:
+    def __init__(self, gmail: 'FakeGmail', run):
+        self.gmail = gmail
+        self.run = run
+
+    def execute(self):
+        self.gmail.record_execute()
+        return self.run()
+
+class FakeBatch:
+    def __init__(self, gmail: 'FakeGmail', callback):
+        self.gmail = gmail
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request: FakeRequest, request_id: str = None) -> None:
+        self.requests.append((request_id, request))
+
+    def execute(self) -> None:
+        self.gmail.record_execute()
+        self.gmail.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                response = request.run()
+            except HttpError as e:
+                self.callback(request_id, None, e)
+            else:
+                self.callback(request_id, response, None)
+
+class FakeGmail:
+    """Mailbox of ``message_count`` messages with ids m0, m1, ...
+
+    ``throttle`` maps message ids to how many times fetching them answers
+    429 before succeeding; ``float('inf')`` throttles them for good. The
+    429 responses carry ``retry_after`` as a Retry-After header when given.
+    Every execute takes ``delay`` seconds, like a round trip to Gmail, and is
+    recorded with the name of the thread it ran on.
+
+    Changes made through add_message, delete_message and the label methods
+    are recorded for the history API, which answers 404 once
+    ``history_expired`` is set.
+    """
+
+    def __init__(
+        self,
+        message_count: int,
+        throttle: Optional[Dict[str, float]] = None,
+        retry_after: Optional[int] = None,
+        delay: float = 0.0
+    ):
+        self.message_count = message_count
+        self.throttle = dict(throttle or {})
+        self.retry_after = retry_after
+        self.delay = delay
+        self.executed_on = []
+        self.batch_sizes = []
+        self.email_address = 'me@example.com'
+        self.history_id = 1
+        self.history_records = []
+        self.history_expired = False
+        self.labels = {}  # message id -> label ids, for messages not just in INBOX
+        self.deleted = set()
+        self._lock = threading.Lock()
+
+    def record_execute(self) -> None:
+        with self._lock:
+            self.executed_on.append(threading.current_thread().name)
+        if self.delay:
+            time.sleep(self.delay)
+
+    # Resource accessors, as in service.users().messages().get(...)
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def history(self) -> 'FakeHistory':
+        return FakeHistory(self)
+
+    def new_batch_http_request(self, callback=None) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    def getProfile(self, userId) -> FakeRequest:
+        return FakeRequest(self, lambda: {'emailAddress': self.email_address, 'historyId': str(self.history_id)})
+
+    def list(self, userId, maxResults=100, pageToken=None, **kwargs) -> FakeRequest:
+        start = int(pageToken or 0)
+
+        def run():
+            # Like messages.list without includeSpamTrash, spam and trash are left out
+            visible = [
+                message_id for message_id in map('m{}'.format, range(self.message_count))
+                if message_id not in self.deleted and not {'SPAM', 'TRASH'} & self.label_ids(message_id)
+            ]
+            end = min(start + maxResults, len(visible))
+            response = {'messages': [{'id': message_id} for message_id in visible[start:end]]}
+            if end < len(visible):
+                response['nextPageToken'] = str(end)
+            return response
+        return FakeRequest(self, run)
+
+    def get(self, userId, id, format='full', **kwargs) -> FakeRequest:
+        def run():
+            if id in self.deleted:
+                raise http_error(404, 'notFound')
+            with self._lock:
+                remaining = self.throttle.get(id, 0)
+                if remaining:
+                    self.throttle[id] = remaining - 1
+            if remaining:
+                raise rate_limit_error(self.retry_after)
+            return {
+                'id': id,
+                'internalDate': '1704103200000',
+                'payload': {
+                    'headers': [
+                        {'name': 'Subject', 'value': f'Subject {id}'},
+                        {'name': 'From', 'value': 'sender@example.com'},
+                        {'name': 'Date', 'value': 'Mon, 01 Jan 2024 10:00:00 +0000'},
+                    ],
+                    'parts': [],
+                },
+            }
+        return FakeRequest(self, run)
+
+    # Mailbox changes, recorded as history records
+    def label_ids(self, message_id: str) -> set:
+        return self.labels.get(message_id, {'INBOX'})
+
+    def add_message(self, label_ids: Iterable[str] = ('INBOX',)) -> str:
+        message_id = f'm{self.message_count}'
+        self.message_count += 1
+        self.labels[message_id] = set(label_ids)
+        self._record('messagesAdded', message_id)
+        return message_id
+
+    def delete_message(self, message_id: str) -> None:
+        self.deleted.add(message_id)
+        self._record('messagesDeleted', message_id)
+
+    def add_labels(self, message_id: str, label_ids: Iterable[str]) -> None:
+        self.labels[message_id] = self.label_ids(message_id) | set(label_ids)
+        self._record('labelsAdded', message_id, label_ids)
+
+    def remove_labels(self, message_id: str, label_ids: Iterable[str]) -> None:
+        self.labels[message_id] = self.label_ids(message_id) - set(label_ids)
+        self._record('labelsRemoved', message_id, label_ids)
+
+    def _record(self, change_type: str, message_id: str, label_ids: Optional[Iterable[str]] = None) -> None:
+        self.history_id += 1
+        change = {'message': {'id': message_id, 'labelIds': sorted(self.label_ids(message_id))}}
+        if label_ids is not None:
+            change['labelIds'] = list(label_ids)
+        self.history_records.append({'id': str(self.history_id), change_type: [change]})
+
+class FakeHistory:
+    """history() resource of a FakeGmail, answering two records per page."""
+
+    PAGE_SIZE = 2
+
+    def __init__(self, gmail: FakeGmail):
+        self.gmail = gmail
+
+    def list(self, userId, startHistoryId, historyTypes=None, pageToken=None) -> FakeRequest:
+        def run():
+            if self.gmail.history_expired:
+                raise http_error(404, 'notFound')
+            records: List[dict] = [
+                record for record in self.gmail.history_records if int(record['id']) > int(startHistoryId)
+            ]
+            start = int(pageToken or 0)
+            response = {'history': records[start:start + self.PAGE_SIZE], 'historyId': str(self.gmail.history_id)}
+            if start + self.PAGE_SIZE < len(records):
+                response['nextPageToken'] = str(start + self.PAGE_SIZE)
+            return response
+        return FakeRequest(self.gmail, run)
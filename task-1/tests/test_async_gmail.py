@@ -0,0 +1,83 @@
+import asyncio
+import time
+import httpx
+import pytest
+import email_service
+from fake_gmail import FakeGmail
+
+DELAY = 0.2
+
+@pytest.fixture
+def app(gmail_scheduler, monkeypatch):
+    """The API with a slow FakeGmail, an empty response cache and a signed-in user."""
+    import auth, crud, main, response_cache
+
+    monkeypatch.setattr(email_service, 'get_gmail_service', lambda: FakeGmail(10, delay=DELAY))
+    monkeypatch.setattr(main, 'email_cache', response_cache.ResponseCache(response_cache.MemoryLRUBackend()))
+    monkeypatch.setitem(main.app.dependency_overrides, auth.get_current_user, lambda: _User())
+
+    async def authenticate_user(db, email, password):
+        return _User()
+    monkeypatch.setattr(crud, 'authenticate_user', authenticate_user)
+    return main.app
+
+def client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test')
+
+async def timed(request):
+    start = time.perf_counter()
+    response = await request
+    return response, time.perf_counter() - start
+
+def test_concurrent_email_requests_overlap(app):
+    requests = email_service.GMAIL_WORKERS
+
+    async def scenario():
+        async with client(app) as http:
+            return await timed(asyncio.gather(*[http.get(f'/emails/m{i}') for i in range(requests)]))
+
+    responses, elapsed = asyncio.run(scenario())
+
+    assert [response.status_code for response in responses] == [200] * requests
+    # Run one after another they would take requests * DELAY
+    assert elapsed < 3 * DELAY
+
+def test_login_is_not_blocked_by_gmail_calls(app):
+    async def scenario():
+        async with client(app) as http:
+            emails = asyncio.gather(*[http.get(f'/emails/m{i}') for i in range(4)])
+            await asyncio.sleep(DELAY / 4)
+            login, login_time = await timed(http.post('/token', data={'username': 'a@example.com', 'password': 'pw'}))
+            await emails
+            return login, login_time
+
+    login, login_time = asyncio.run(scenario())
+
+    assert login.status_code == 200
+    assert login_time < DELAY / 2
+
+class _User:
+    id = 1
+    email = 'user@example.com'
+    is_active = True
+    name = 'User'
+
+def test_large_listings_must_be_streamed(app):
+    async def scenario():
+        async with client(app) as http:
+            return [
+                await http.get('/emails', params=params) for params in [
+                    {'max_results': email_service.MAX_BUFFERED_RESULTS + 1},
+                    {'max_results': email_service.MAX_RESULTS + 1, 'stream': True},
+                    {'max_results': 0},
+                    {'max_results': email_service.MAX_BUFFERED_RESULTS + 1, 'stream': True},
+                ]
+            ]
+
+    too_many, over_limit, zero, streamed = asyncio.run(scenario())
+
+    assert too_many.status_code == 400
+    assert over_limit.status_code == 422
+    assert zero.status_code == 422
+    assert streamed.status_code == 200
+    assert len(streamed.text.splitlines()) == 10
@@ -0,0 +1,133 @@
+import base64
+import os
+import pytest
+from fastapi.testclient import TestClient
+from attachment_cache import AttachmentCache
+
+CONTENT = bytes(range(256)) * 40
+URL = '/emails/m1/attachments/a1'
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    """Serve the attachment endpoints from a fresh cache, recording Gmail downloads."""
+    import auth, email_service, main
+
+    calls = []
+
+    async def get_attachment_data_async(message_id, attachment_id, **kwargs):
+        calls.append((message_id, attachment_id))
+        return base64.urlsafe_b64encode(CONTENT).decode()
+    monkeypatch.setattr(email_service, 'get_attachment_data_async', get_attachment_data_async)
+    monkeypatch.setattr(main, 'attachments', AttachmentCache(str(tmp_path)))
+    monkeypatch.setitem(main.app.dependency_overrides, auth.get_current_user, lambda: _User())
+    return calls
+
+@pytest.fixture
+def client(downloads):
+    import main
+    return TestClient(main.app)
+
+def test_download_is_cached(client, downloads):
+    first = client.get(URL)
+    second = client.get(URL)
+
+    assert first.content == second.content == CONTENT
+    assert first.headers['content-length'] == str(len(CONTENT))
+    assert first.headers['etag'] == second.headers['etag']
+    assert len(downloads) == 1
+
+def test_matching_etag_answers_304(client):
+    etag = client.get(URL).headers['etag']
+
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(URL, headers={'If-None-Match': f'"other", {etag}'}).status_code == 304
+    assert client.get(URL, headers={'If-None-Match': '"other"'}).status_code == 200
+
+@pytest.mark.parametrize('range_header, start, end', [
+    ('bytes=2-5', 2, 5),
+    ('bytes=10000-', 10000, len(CONTENT) - 1),
+    ('bytes=-3', len(CONTENT) - 3, len(CONTENT) - 1),
+    ('bytes=100-99999', 100, len(CONTENT) - 1),
+])
+def test_ranges_answer_206(client, range_header, start, end):
+    response = client.get(URL, headers={'Range': range_header})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers['content-range'] == f'bytes {start}-{end}/{len(CONTENT)}'
+
+@pytest.mark.parametrize('range_header', [f'bytes={len(CONTENT)}-', 'bytes=9-3'])
+def test_unsatisfiable_ranges_answer_416(client, range_header):
+    response = client.get(URL, headers={'Range': range_header})
+
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(CONTENT)}'
+
+def test_if_range_sends_the_range_only_for_the_current_etag(client):
+    etag = client.get(URL).headers['etag']
+
+    current = client.get(URL, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    stale = client.get(URL, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+
+    assert (current.status_code, current.content) == (206, CONTENT[:10])
+    assert (stale.status_code, stale.content) == (200, CONTENT)
+
+def test_base64_endpoint(client):
+    response = client.get(URL + '/base64')
+
+    assert response.json() == {'attachment_data': base64.b64encode(CONTENT).decode()}
+
+def test_base64_endpoint_answers_304_for_a_matching_etag(client):
+    etag = client.get(URL + '/base64').headers['etag']
+
+    response = client.get(URL + '/base64', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+
+def test_servers_with_zero_copy_send_get_the_file(tmp_path):
+    import asyncio
+    from attachment_cache import BlobResponse
+
+    entry = AttachmentCache(str(tmp_path)).put('m1', 'a1', [CONTENT])
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'extensions': {'http.response.zerocopysend': {}}}
+    asyncio.run(BlobResponse(entry.file, 10, 100, status_code=206)(scope, None, send))
+
+    start, body = messages
+    assert start['status'] == 206
+    assert (b'content-length', b'100') in start['headers']
+    assert body == {'type': 'http.response.zerocopysend', 'file': entry.file, 'offset': 10, 'count': 100}
+    assert entry.file.closed
+
+def test_vanished_blob_is_downloaded_again(client, downloads):
+    import main
+
+    client.get(URL)
+    entry = main.attachments.get('m1', 'a1')
+    entry.file.close()
+    os.remove(entry.path)
+
+    assert client.get(URL).content == CONTENT
+    assert len(downloads) == 2
+
+def test_entry_stays_readable_after_eviction(tmp_path):
+    cache = AttachmentCache(str(tmp_path), max_bytes=len(CONTENT))
+    cache.put('m1', 'a1', [CONTENT]).file.close()
+    entry = cache.get('m1', 'a1')
+
+    # A second attachment pushes the first one out of the cache
+    cache.put('m2', 'a2', [b'x' * len(CONTENT)]).file.close()
+
+    assert not os.path.exists(entry.path)
+    assert cache.get('m1', 'a1') is None
+    with entry.file:
+        assert entry.file.read() == CONTENT
+
+class _User:
+    id = 1
+    email = 'user@example.com'
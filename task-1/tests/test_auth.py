@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+import pytest
+from fastapi.testclient import TestClient
+import auth, crud
+
+class _User:
+    id = 1
+    email = 'user@example.com'
+    name = 'User'
+    is_active = True
+    hashed_password = '$2b$12$' + 'x' * 53
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    cache = auth.TokenCache()
+    monkeypatch.setattr(auth, 'token_cache', cache)
+    return cache
+
+@pytest.fixture
+def client(token_cache, monkeypatch):
+    import main
+
+    async def get_user_by_email(db, email):
+        return _User() if email == _User.email else None
+    monkeypatch.setattr(crud, 'get_user_by_email', get_user_by_email)
+    return TestClient(main.app)
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_revoked_token_is_rejected_until_it_expires(token_cache):
+    user = auth.schemas.User(id=1, email='a@example.com', name='A', is_active=True)
+    token_cache.put('token', user, time.time() + 60)
+
+    token_cache.revoke('token', time.time() + 60)
+
+    assert token_cache.get('token') is None
+    assert token_cache.is_revoked('token')
+    # A verification that was already running cannot cache it again
+    token_cache.put('token', user, time.time() + 60)
+    assert token_cache.get('token') is None
+
+def test_expired_revocations_are_dropped(token_cache):
+    token_cache.revoke('old', time.time() - 1)
+    assert not token_cache.is_revoked('old')
+
+    token_cache.revoke('new', time.time() + 60)
+    assert token_cache.stats()['revoked'] == 1
+
+def test_logout_revokes_the_token(client):
+    token = auth.create_access_token({'sub': _User.email}, timedelta(minutes=5))
+    other = auth.create_access_token({'sub': _User.email}, timedelta(minutes=6))
+
+    assert client.post('/logout', headers=bearer(token)).status_code == 200
+    # The next request verifies the token again instead of finding it in the cache
+    assert client.post('/logout', headers=bearer(token)).status_code == 401
+    assert client.post('/logout', headers=bearer(other)).status_code == 200
+
+def test_login_replaces_hashes_with_too_few_rounds(tmp_path, monkeypatch):
+    from passlib.hash import bcrypt
+    from test_users import run_with_session
+    import models
+    monkeypatch.setattr(crud, 'record_login', lambda user_id: None)
+    weak_hash = bcrypt.using(rounds=4).hash('pw')
+
+    async def scenario(db):
+        db.add(models.User(email='a@example.com', name='A', hashed_password=weak_hash))
+        await db.commit()
+        user = await crud.authenticate_user(db, 'a@example.com', 'pw')
+        return user.hashed_password
+
+    new_hash = run_with_session(tmp_path, scenario)
+
+    assert bcrypt.from_string(weak_hash).rounds == 4
+    assert bcrypt.from_string(new_hash).rounds == auth.BCRYPT_ROUNDS
+    assert auth.pwd_context.verify('pw', new_hash)
+
+def test_login_fails_fast_when_hashing_is_saturated(client, monkeypatch):
+    slots = auth.threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(auth, '_hash_slots', slots)
+
+    start = time.perf_counter()
+    response = client.post('/token', data={'username': _User.email, 'password': 'pw'})
+
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert time.perf_counter() - start < 1
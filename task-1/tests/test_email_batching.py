@@ -0,0 +1,21 @@
+import pytest
+import email_service
+from fake_gmail import FakeGmail
+
+@pytest.mark.parametrize('batch_size, round_trips', [(1, 51), (50, 2), (20, 4)])
+def test_listing_round_trips(gmail_scheduler, batch_size, round_trips):
+    gmail = FakeGmail(50)
+
+    emails = email_service.fetch_emails(gmail, 50, batch_size)
+
+    # One messages.list call plus one call per batch, or per message without batching
+    assert len(gmail.executed_on) == round_trips
+    assert [email['message_id'] for email in emails] == [f'm{i}' for i in range(50)]
+
+def test_batches_are_capped_at_batch_size(gmail_scheduler):
+    gmail = FakeGmail(120)
+
+    email_service.fetch_emails(gmail, 120, batch_size=50)
+
+    # The listing pages hold 100 and 20 ids; each page is split into batches
+    assert gmail.batch_sizes == [50, 50, 20]
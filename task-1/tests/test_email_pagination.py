@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+import email_service
+from fake_gmail import FakeGmail
+
+def run_with_timeout(func, timeout=10):
+    """Run func on a thread, failing instead of hanging the test run."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert result, "call did not finish"
+    return result[0]
+
+def test_pages_follow_page_tokens(gmail_scheduler):
+    gmail = FakeGmail(250)
+    pages = list(email_service.iter_email_pages(gmail, 250, batch_size=50, service_factory=lambda: gmail))
+
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert [email['message_id'] for email in pages[0][:2]] == ['m0', 'm1']
+
+def test_abandoned_listings_release_listing_threads(gmail_scheduler):
+    # Two pages with a window of one: the producer has queued its last page
+    # and is waiting to hand over the end marker when the consumer goes away
+    for _ in range(email_service.GMAIL_WORKERS + 1):
+        gmail = FakeGmail(200)
+        pages = email_service.iter_email_pages(gmail, 200, service_factory=lambda: gmail, window=1)
+        run_with_timeout(lambda: next(pages))
+        pages.close()
+
+    gmail = FakeGmail(150)
+    emails = run_with_timeout(lambda: email_service.fetch_emails(gmail, 150, service_factory=lambda: gmail))
+    assert len(emails) == 150
+
+def test_stalled_consumers_do_not_hold_listing_threads(gmail_scheduler):
+    # Readers that stop after one page, without closing their streams
+    stalled = []
+    for _ in range(email_service.GMAIL_WORKERS):
+        gmail = FakeGmail(2000)
+        pages = email_service.iter_email_pages(gmail, 1000, service_factory=lambda gmail=gmail: gmail)
+        run_with_timeout(lambda: next(pages))
+        stalled.append(pages)
+
+    gmail = FakeGmail(150)
+    emails = run_with_timeout(lambda: email_service.fetch_emails(gmail, 150, service_factory=lambda: gmail))
+    assert len(emails) == 150
+
+    for pages in stalled:
+        pages.close()
+
+def test_listing_stays_a_window_ahead(gmail_scheduler):
+    gmail = FakeGmail(1000)
+    listed = []
+    list_messages = gmail.list
+    gmail.list = lambda *args, **kwargs: (listed.append(kwargs['pageToken']), list_messages(*args, **kwargs))[1]
+
+    pages = email_service.iter_email_pages(gmail, 1000, batch_size=50, service_factory=lambda: gmail, window=2)
+    run_with_timeout(lambda: next(pages))
+    deadline = time.monotonic() + 2
+    while len(listed) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    # The page handed over plus two buffered ones, and no more
+    assert listed == [None, '100', '200']
+    pages.close()
+
+def test_resumed_pages_use_the_current_threads_client(gmail_scheduler):
+    clients = {}
+
+    def thread_client():
+        name = threading.current_thread().name
+        if name not in clients:
+            clients[name] = FakeGmail(300)
+        return clients[name]
+
+    pages = email_service.iter_email_pages(thread_client(), 300, batch_size=50, service_factory=thread_client)
+    for _ in range(3):
+        # Each page is fetched on a different thread, as the async stream does
+        run_with_timeout(lambda: next(pages))
+    pages.close()
+
+    # The client passed in was built on this thread, which never fetches a page
+    assert clients.pop(threading.current_thread().name).executed_on == []
+    # Listing threads plus one client per resuming thread, each used only on its own thread
+    assert len(clients) >= 4
+    for name, client in clients.items():
+        assert set(client.executed_on) == {name}
+
+def test_cancelled_stream_closes_pages_after_the_running_fetch(gmail_scheduler, monkeypatch):
+    gmail = FakeGmail(1000, delay=0.2)
+    monkeypatch.setattr(email_service, 'get_gmail_service', lambda: gmail)
+    generators = []
+    iter_email_pages = email_service.iter_email_pages
+
+    def recording_iter_email_pages(*args, **kwargs):
+        # Keeping a reference means garbage collection cannot close the generator for us
+        generators.append(iter_email_pages(*args, **kwargs))
+        return generators[-1]
+    monkeypatch.setattr(email_service, 'iter_email_pages', recording_iter_email_pages)
+
+    async def consume():
+        async for _ in email_service.iter_emails_async(1000):
+            pass
+
+    async def scenario():
+        task = asyncio.create_task(consume())
+        # The first page is still being listed on a worker thread
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    task = asyncio.run(scenario())
+
+    assert task.cancelled()
+    assert generators[0].gi_frame is None
@@ -0,0 +1,126 @@
+import pytest
+import email_service
+from fake_gmail import FakeGmail, http_error
+
+INF = float('inf')
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of waiting."""
+    recorded = []
+    monkeypatch.setattr(email_service.time, 'sleep', recorded.append)
+    return recorded
+
+def test_token_bucket_reports_wait_for_overdrawn_units():
+    bucket = email_service.TokenBucket(rate=10)
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.01)
+
+def test_batch_retries_only_throttled_messages(gmail_scheduler, sleeps):
+    gmail = FakeGmail(10, throttle={'m3': 2, 'm7': 1})
+    ids = [f'm{i}' for i in range(10)]
+
+    messages = email_service.get_messages_batch(gmail, ids, batch_size=10)
+
+    assert [message['id'] for message in messages] == ids
+    assert gmail.batch_sizes == [10, 2, 1]
+    assert len(sleeps) == 2
+
+def test_batch_raises_when_messages_stay_throttled(gmail_scheduler, sleeps):
+    gmail = FakeGmail(10, throttle={'m3': INF, 'm7': INF}, retry_after=7)
+    ids = [f'm{i}' for i in range(10)]
+
+    with pytest.raises(email_service.GmailRateLimitError) as error:
+        email_service.get_messages_batch(gmail, ids, batch_size=10)
+
+    assert error.value.retry_after == 7
+    # One initial round plus max_retries retries, with no sleep after the last one
+    assert len(gmail.batch_sizes) == gmail_scheduler.max_retries + 1
+    assert sleeps == [7] * gmail_scheduler.max_retries
+
+def test_long_retry_after_is_not_waited_out(gmail_scheduler, sleeps):
+    gmail = FakeGmail(10, throttle={'m3': 1}, retry_after=3600)
+
+    with pytest.raises(email_service.GmailRateLimitError) as error:
+        email_service.get_messages_batch(gmail, [f'm{i}' for i in range(10)], batch_size=10)
+    assert error.value.retry_after == 3600
+    assert sleeps == []
+
+    with pytest.raises(email_service.GmailRateLimitError) as error:
+        email_service.get_email_data(FakeGmail(1, throttle={'m0': 1}, retry_after=3600), 'm0')
+    assert error.value.retry_after == 3600
+    assert sleeps == []
+
+def test_batch_skips_messages_that_fail_permanently(gmail_scheduler, monkeypatch):
+    gmail = FakeGmail(3)
+    get = gmail.get
+
+    def get_with_deleted_message(userId, id, **kwargs):
+        request = get(userId, id, **kwargs)
+        if id == 'm1':
+            def run():
+                raise http_error(404, 'notFound')
+            request.run = run
+        return request
+    monkeypatch.setattr(gmail, 'get', get_with_deleted_message)
+
+    messages = email_service.get_messages_batch(gmail, ['m0', 'm1', 'm2'])
+    assert [message['id'] for message in messages] == ['m0', 'm2']
+
+def test_single_fetch_retries_then_raises(gmail_scheduler, sleeps):
+    assert email_service.get_email_data(FakeGmail(1, throttle={'m0': 2}), 'm0')['message_id'] == 'm0'
+
+    with pytest.raises(email_service.GmailRateLimitError):
+        email_service.get_email_data(FakeGmail(1, throttle={'m0': INF}), 'm0')
+
+@pytest.mark.parametrize('batch_size', [1, 50])
+def test_listing_is_never_partial(gmail_scheduler, sleeps, batch_size):
+    gmail = FakeGmail(10, throttle={'m3': INF})
+
+    with pytest.raises(email_service.GmailRateLimitError):
+        email_service.fetch_emails(gmail, 10, batch_size, service_factory=lambda: gmail)
+
+def test_background_calls_wait_for_interactive_ones(gmail_scheduler, monkeypatch):
+    waits = []
+    monkeypatch.setattr(email_service.time, 'sleep', lambda seconds: (waits.append(seconds), finish()))
+
+    def finish():
+        gmail_scheduler._interactive_waiting = 0
+
+    gmail_scheduler._interactive_waiting = 1
+    gmail_scheduler.acquire(1, 'mailbox', email_service.BACKGROUND)
+    assert waits
+
+    waits.clear()
+    gmail_scheduler._interactive_waiting = 1
+    gmail_scheduler.acquire(1, 'mailbox', email_service.INTERACTIVE)
+    assert not waits
+
+def test_calls_share_the_mailbox_budget(monkeypatch):
+    # Every app user reads the one mailbox in token.pickle, so all calls draw on its bucket
+    scheduler = email_service.GmailScheduler(user_rate=250, global_rate=1e9)
+    waits = []
+    monkeypatch.setattr(email_service.time, 'sleep', waits.append)
+    gmail = FakeGmail(2)
+
+    for message_id in ['m0', 'm1']:
+        scheduler.execute(gmail.get(userId='me', id=message_id), 250)
+
+    assert waits == [pytest.approx(1, abs=0.05)]
+
+def test_emails_endpoint_answers_429_when_throttled(gmail_scheduler, sleeps, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth, main
+
+    gmail = FakeGmail(10, throttle={'m3': INF}, retry_after=3)
+    monkeypatch.setattr(email_service, 'get_gmail_service', lambda: gmail)
+    monkeypatch.setitem(main.app.dependency_overrides, auth.get_current_user, lambda: _User())
+
+    response = TestClient(main.app).get('/emails', params={'max_results': 10, 'cached': False})
+
+    assert response.status_code == 429
+    assert response.headers['retry-after'] == '3'
+
+class _User:
+    id = 1
+    email = 'user@example.com'
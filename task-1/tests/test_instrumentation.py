@@ -0,0 +1,57 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+import instrumentation
+
+def test_failed_queries_do_not_leak_start_times():
+    engine = create_engine("sqlite://")
+    instrumentation.instrument_engine(engine)
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(Exception):
+                connection.execute(text("SELECT * FROM missing_table"))
+        connection.execute(text("SELECT 1"))
+
+        assert connection.info["query_start"] == []
+
+def instrumented_app(registry):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def do_work():
+        with instrumentation.span("gmail"):
+            pass
+        return {}
+
+    app.add_middleware(instrumentation.InstrumentationMiddleware, registry=registry)
+    return app
+
+def test_requests_get_server_timing_and_metrics():
+    registry = instrumentation.MetricsRegistry()
+    registry.register_counter("things_total", "Things counted.", lambda: 7)
+    client = TestClient(instrumented_app(registry))
+
+    response = client.get("/work")
+    client.get("/work")
+    client.get("/missing")
+
+    stages = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    assert stages == ["gmail", "total"]
+    metrics = registry.render().splitlines()
+    assert 'http_request_duration_seconds_count{handler="do_work",method="GET",status="200"} 2' in metrics
+    assert 'http_request_duration_seconds_bucket{handler="do_work",method="GET",status="200",le="+Inf"} 2' in metrics
+    assert 'request_stage_duration_seconds_count{handler="do_work",stage="gmail"} 2' in metrics
+    assert 'http_request_duration_seconds_count{handler="unmatched",method="GET",status="404"} 1' in metrics
+    assert metrics[-3:] == ["# HELP things_total Things counted.", "# TYPE things_total counter", "things_total 7"]
+
+def test_metrics_endpoint_serves_the_prometheus_format():
+    import main
+
+    response = TestClient(main.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert "auth_token_cache_hits_total" in response.text
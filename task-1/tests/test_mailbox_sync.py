@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import email_service, models
+from fake_gmail import FakeGmail
+
+@pytest.fixture
+def db(tmp_path, gmail_scheduler, monkeypatch):
+    monkeypatch.setattr(email_service, 'SYNC_INITIAL_MESSAGES', 5)
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def stored_ids(db, gmail):
+    return {email['message_id'] for email in email_service.get_stored_emails(db, gmail.email_address, 100)}
+
+def sync_state(db, gmail):
+    return db.get(models.MailboxSyncState, gmail.email_address)
+
+def test_first_sync_stores_recent_messages(db):
+    gmail = FakeGmail(8)
+
+    assert email_service.sync_mailbox(gmail, db) == gmail.email_address
+
+    assert stored_ids(db, gmail) == {'m0', 'm1', 'm2', 'm3', 'm4'}
+    assert sync_state(db, gmail).history_id == '1'
+
+def test_history_sync_applies_changes(db):
+    gmail = FakeGmail(3)
+    email_service.sync_mailbox(gmail, db)
+
+    added = gmail.add_message()
+    gmail.add_message(['SPAM'])
+    gmail.delete_message('m0')
+    gmail.add_labels('m1', ['TRASH'])
+    gmail.add_labels('m2', ['STARRED'])
+    executed = len(gmail.executed_on)
+    email_service.sync_mailbox(gmail, db)
+
+    assert stored_ids(db, gmail) == {'m2', added}
+    # Profile, three pages of history and one batch for the added message; no listing
+    assert len(gmail.executed_on) - executed == 5
+    assert sync_state(db, gmail).history_id == str(gmail.history_id)
+
+def test_messages_moved_out_of_spam_and_trash_are_stored(db):
+    gmail = FakeGmail(2)
+    spam = gmail.add_message(['SPAM'])
+    email_service.sync_mailbox(gmail, db)
+    assert stored_ids(db, gmail) == {'m0', 'm1'}
+
+    gmail.add_labels('m0', ['TRASH'])
+    gmail.remove_labels('m0', ['TRASH'])
+    gmail.remove_labels(spam, ['SPAM'])
+    email_service.sync_mailbox(gmail, db)
+
+    assert stored_ids(db, gmail) == {'m0', 'm1', spam}
+
+def test_message_added_and_deleted_between_syncs_is_not_stored(db):
+    gmail = FakeGmail(1)
+    email_service.sync_mailbox(gmail, db)
+
+    short_lived = gmail.add_message()
+    gmail.delete_message(short_lived)
+    email_service.sync_mailbox(gmail, db)
+
+    assert stored_ids(db, gmail) == {'m0'}
+
+def test_expired_history_cursor_falls_back_to_full_sync(db):
+    gmail = FakeGmail(3)
+    email_service.sync_mailbox(gmail, db)
+
+    gmail.delete_message('m1')
+    added = gmail.add_message()
+    gmail.history_expired = True
+    email_service.sync_mailbox(gmail, db)
+
+    assert stored_ids(db, gmail) == {'m0', 'm2', added}
+    assert sync_state(db, gmail).history_id == str(gmail.history_id)
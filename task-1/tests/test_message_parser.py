@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import message_parser
+
+def attachment(filename, attachment_id, mime_type='application/octet-stream'):
+    return {'filename': filename, 'mimeType': mime_type, 'body': {'attachmentId': attachment_id}}
+
+def multipart(mime_type, *parts):
+    return {'filename': '', 'mimeType': mime_type, 'body': {'size': 0}, 'parts': list(parts)}
+
+TEXT = {'filename': '', 'mimeType': 'text/plain', 'body': {'size': 5, 'data': 'aGVsbG8='}}
+
+def message(headers, payload=None, internal_date='1704103200000'):
+    payload = dict(payload or TEXT)
+    payload['headers'] = [{'name': name, 'value': value} for name, value in headers]
+    return {'id': 'm1', 'internalDate': internal_date, 'payload': payload}
+
+def test_headers_are_matched_case_insensitively_and_first_wins():
+    headers = [
+        {'name': 'SUBJECT', 'value': 'First'},
+        {'name': 'subject', 'value': 'Second'},
+        {'name': 'From', 'value': 'a@example.com'},
+        {'name': 'X-Other', 'value': 'ignored'},
+    ]
+
+    assert message_parser.parse_headers(headers) == {'subject': 'First', 'from': 'a@example.com'}
+
+def test_missing_headers_get_defaults():
+    parsed = message_parser.parse_message(message([], internal_date=None))
+
+    assert (parsed['subject'], parsed['sender'], parsed['timestamp']) == ('No Subject', 'Unknown', '')
+
+def test_nested_multipart_attachments_in_document_order():
+    payload = multipart(
+        'multipart/mixed',
+        multipart('multipart/alternative', TEXT, dict(TEXT, mimeType='text/html')),
+        attachment('report.pdf', 'a1', 'application/pdf'),
+        multipart(
+            'message/rfc822',
+            multipart(
+                'multipart/mixed',
+                multipart('multipart/related', TEXT, attachment('logo.png', 'a2', 'image/png')),
+                attachment('forwarded.csv', 'a3', 'text/csv'),
+            ),
+        ),
+        attachment('last.txt', 'a4', 'text/plain'),
+    )
+
+    attachments = message_parser.parse_message(message([], payload))['attachments']
+
+    assert [(a['filename'], a['id'], a['mimeType']) for a in attachments] == [
+        ('report.pdf', 'a1', 'application/pdf'),
+        ('logo.png', 'a2', 'image/png'),
+        ('forwarded.csv', 'a3', 'text/csv'),
+        ('last.txt', 'a4', 'text/plain'),
+    ]
+
+def test_single_part_attachment_is_found():
+    payload = attachment('scan.jpg', 'a1', 'image/jpeg')
+
+    assert [a['filename'] for a in message_parser.parse_message(message([], payload))['attachments']] == ['scan.jpg']
+
+UTC = timezone.utc
+
+@pytest.mark.parametrize('value, expected', [
+    ('Mon, 01 Jan 2024 10:00:00 +0000', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('Mon, 1 Jan 2024 10:00:00 +0000', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('1 Jan 2024 10:00:00 +0000', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('Mon, 1 Jan 2024 10:00:00 GMT', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('Mon, 1 Jan 2024 10:00:00 +0000 (UTC)', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('Mon, 1 Jan 2024 10:00 +0000', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('Mon, 1 Jan 24 10:00:00 +0000', datetime(2024, 1, 1, 10, tzinfo=UTC)),
+    ('Mon, 1 Jan 2024 05:00:00 EST', datetime(2024, 1, 1, 5, tzinfo=timezone(timedelta(hours=-5)))),
+    ('Mon, 1 Jan 2024 11:30:00 +0130', datetime(2024, 1, 1, 11, 30, tzinfo=timezone(timedelta(hours=1, minutes=30)))),
+])
+def test_rfc_2822_date_variants(value, expected):
+    parsed = message_parser.parse_date(value)
+
+    assert parsed == expected
+    assert parsed.utcoffset() == expected.utcoffset()
+
+@pytest.mark.parametrize('value', ['', 'yesterday', 'Mon, 32 Jan 2024 10:00:00 +0000', 'Mon, 1 Foo 2024 10:00:00 +0000'])
+def test_unparseable_dates(value):
+    assert message_parser.parse_date(value) is None
+
+def test_timestamp_keeps_the_senders_local_time():
+    parsed = message_parser.parse_message(message([('Date', 'Mon, 1 Jan 2024 17:45:00 +0200')]))
+
+    assert parsed['timestamp'] == 'January 01, 2024 05:45 PM'
+
+@pytest.mark.parametrize('headers', [[], [('Date', 'not a date')]])
+def test_internal_date_is_the_fallback(headers):
+    # 1704110400000 ms is 2024-01-01 12:00 UTC
+    parsed = message_parser.parse_message(message(headers, internal_date='1704110400000'))
+
+    assert parsed['timestamp'] == 'January 01, 2024 12:00 PM'
@@ -0,0 +1,19 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from middleware import SECURE_HEADERS, SecureHeadersMiddleware
+
+def test_secure_headers_replace_the_applications_own():
+    app = FastAPI()
+
+    @app.get("/page")
+    async def page():
+        return JSONResponse({}, headers={"X-Frame-Options": "SAMEORIGIN", "X-Custom": "kept"})
+
+    app.add_middleware(SecureHeadersMiddleware)
+    response = TestClient(app).get("/page")
+
+    assert response.headers.get_list("x-frame-options") == ["DENY"]
+    assert response.headers["x-custom"] == "kept"
+    for name, value in SECURE_HEADERS:
+        assert response.headers.get_list(name.decode()) == [value.decode()]
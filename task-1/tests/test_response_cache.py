@@ -0,0 +1,138 @@
+import asyncio
+import pickle
+import time
+from email.utils import formatdate
+from typing import Optional
+import pytest
+from starlette.requests import Request
+from response_cache import CacheBackend, CachedResponse, MemoryLRUBackend, ResponseCache
+
+class FakeSharedBackend(CacheBackend):
+    """Stand-in for a shared store such as Redis: entries are kept as serialized bytes."""
+
+    def __init__(self):
+        self.store = {}  # key -> (pickled entry, expiry)
+        self.sets = 0
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        item = self.store.get(key)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return pickle.loads(item[0])
+
+    async def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        self.sets += 1
+        self.store[key] = (pickle.dumps(value), time.monotonic() + ttl)
+
+class CountingFetch:
+    def __init__(self, content=None, delay: float = 0.05, error: Exception = None):
+        self.content = content if content is not None else {"emails": [1, 2, 3]}
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.content
+
+def make_request(headers=None) -> Request:
+    raw_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/emails", "headers": raw_headers})
+
+def test_backend_interface_is_abstract():
+    class Incomplete(CacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.parametrize("backend_class", [MemoryLRUBackend, FakeSharedBackend])
+def test_concurrent_misses_share_one_fetch(backend_class):
+    async def scenario():
+        cache = ResponseCache(backend_class())
+        fetch = CountingFetch()
+        entries = await asyncio.gather(*[cache.get_or_fetch("user:emails", fetch) for _ in range(5)])
+        again = await cache.get_or_fetch("user:emails", fetch)
+        return fetch.calls, entries, again
+
+    calls, entries, again = asyncio.run(scenario())
+    assert calls == 1
+    assert len({entry.etag for entry in entries}) == 1
+    assert again == entries[0]
+    assert again.body == b'{"emails":[1,2,3]}'
+
+def test_cancelled_caller_does_not_cancel_shared_fetch():
+    async def scenario():
+        backend = FakeSharedBackend()
+        cache = ResponseCache(backend)
+        fetch = CountingFetch(delay=0.1)
+        first = asyncio.create_task(cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.01)
+        # The first client disconnects while the fetch is running
+        first.cancel()
+        entry = await second
+        return first, entry, fetch.calls, backend.sets
+
+    first, entry, calls, sets = asyncio.run(scenario())
+    assert first.cancelled()
+    assert entry.body == b'{"emails":[1,2,3]}'
+    assert calls == 1
+    assert sets == 1
+
+def test_fetch_finishes_when_every_caller_is_gone():
+    async def scenario():
+        cache = ResponseCache(FakeSharedBackend())
+        fetch = CountingFetch(delay=0.05)
+        caller = asyncio.create_task(cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+        await cache.get_or_fetch("key", fetch)
+        return fetch.calls
+
+    assert asyncio.run(scenario()) == 1
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        cache = ResponseCache(FakeSharedBackend())
+        failing = CountingFetch(error=RuntimeError("gmail down"))
+        results = await asyncio.gather(
+            *[cache.get_or_fetch("key", failing) for _ in range(3)], return_exceptions=True
+        )
+        succeeding = CountingFetch()
+        await cache.get_or_fetch("key", succeeding)
+        return failing.calls, results, succeeding.calls
+
+    failing_calls, results, succeeding_calls = asyncio.run(scenario())
+    assert failing_calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert succeeding_calls == 1
+
+def test_entries_expire_after_ttl():
+    async def scenario():
+        cache = ResponseCache(FakeSharedBackend(), ttl=0)
+        fetch = CountingFetch(delay=0)
+        await cache.get_or_fetch("key", fetch)
+        await cache.get_or_fetch("key", fetch)
+        return fetch.calls
+
+    assert asyncio.run(scenario()) == 2
+
+def test_revalidation_answers_304():
+    cache = ResponseCache(FakeSharedBackend())
+    entry = CachedResponse(body=b"[]", etag='"abc"', last_modified=time.time() - 60)
+
+    response = cache.response(make_request(), entry)
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"abc"'
+
+    assert cache.response(make_request({"If-None-Match": '"abc"'}), entry).status_code == 304
+    assert cache.response(make_request({"If-None-Match": '"other"'}), entry).status_code == 200
+    since = formatdate(time.time(), usegmt=True)
+    assert cache.response(make_request({"If-Modified-Since": since}), entry).status_code == 304
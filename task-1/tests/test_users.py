@@ -0,0 +1,218 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import auth, crud, models, schemas
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    """Replace bcrypt with a trivial hash; the tests are about the database writes."""
+    async def hash_async(password):
+        return "hashed:" + password
+
+    async def hash_many(passwords):
+        return ["hashed:" + password for password in passwords]
+    monkeypatch.setattr(auth, "get_password_hash_async", hash_async)
+    monkeypatch.setattr(auth, "hash_passwords_async", hash_many)
+    return hash_many
+
+def run_with_session(tmp_path, scenario, insert_returning=True):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+        # MySQL has no INSERT ... RETURNING; pretend SQLite doesn't either
+        engine.dialect.insert_returning = insert_returning
+        async with engine.begin() as connection:
+            await connection.run_sync(models.Base.metadata.create_all)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                return await scenario(db)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("insert_returning", [True, False])
+def test_create_user_returns_the_new_row(tmp_path, fast_hashing, insert_returning):
+    async def scenario(db):
+        created = await crud.create_user(db, schemas.UserCreate(email="a@example.com", name="A", password="pw"))
+        duplicate = await crud.create_user(db, schemas.UserCreate(email="a@example.com", name="B", password="pw"))
+        stored = await crud.get_user_by_email(db, "a@example.com")
+        return created, duplicate, stored
+
+    created, duplicate, stored = run_with_session(tmp_path, scenario, insert_returning)
+
+    assert (created.id, created.email, created.name, created.is_active) == (stored.id, "a@example.com", "A", True)
+    assert stored.hashed_password == "hashed:pw"
+    assert duplicate is None
+
+def test_bulk_create_skips_registered_emails(tmp_path, fast_hashing):
+    users = [schemas.UserCreate(email=f"user{i}@example.com", name=f"User {i}", password="pw") for i in range(5)]
+
+    async def scenario(db):
+        await crud.create_user(db, users[2])
+        result = await crud.bulk_create_users(db, users + [users[0]], hash_passwords=fast_hashing)
+        count = await db.scalar(select(func.count()).select_from(models.User))
+        return result, count
+
+    result, count = run_with_session(tmp_path, scenario)
+
+    assert result.created == 4
+    assert sorted(result.skipped) == ["user0@example.com", "user2@example.com"]
+    assert count == 5
+
+def test_bulk_hashing_uses_bounded_thread_pool():
+    async def scenario():
+        return await auth.hash_passwords_async(["a", "b", "c"])
+
+    hashes = asyncio.run(scenario())
+
+    assert [auth.verify_password(p, h) for p, h in zip("abc", hashes)] == [True, True, True]
+    assert auth._bulk_hash_executor._max_workers == auth.BULK_HASH_WORKERS
+
+def test_bulk_endpoint_rejects_oversized_imports(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    async def bulk_create_users(db, users):
+        raise AssertionError("oversized import reached the database")
+    monkeypatch.setattr(crud, "bulk_create_users", bulk_create_users)
+    monkeypatch.setitem(main.app.dependency_overrides, auth.get_current_user, lambda: None)
+    users = [
+        {"email": f"user{i}@example.com", "name": f"User {i}", "password": "pw"}
+        for i in range(crud.BULK_INSERT_CHUNK_SIZE + 1)
+    ]
+
+    response = TestClient(main.app).post("/users/bulk", json=users)
+
+    assert response.status_code == 413
+    assert "import_users.py" in response.json()["detail"]
+
+@pytest.fixture
+def pending_logins(monkeypatch):
+    """An empty last_login buffer for the test."""
+    pending = {}
+    monkeypatch.setattr(crud, "_pending_logins", pending)
+    return pending
+
+async def add_users(db, count):
+    db.add_all([models.User(email=f"user{i}@example.com", name=f"User {i}", hashed_password="x") for i in range(count)])
+    await db.commit()
+
+async def last_logins(db):
+    rows = await db.execute(select(models.User.id, models.User.last_login).order_by(models.User.id))
+    return dict(rows.all())
+
+def test_flush_writes_buffered_logins_in_one_update(tmp_path, pending_logins):
+    from sqlalchemy import event
+    statements = []
+
+    async def scenario(db):
+        await add_users(db, 3)
+        event.listen(db.bind.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        crud.record_login(1)
+        crud.record_login(3)
+        written = await crud.flush_last_logins(db)
+        return written, await last_logins(db)
+
+    written, stored = run_with_session(tmp_path, scenario)
+
+    assert written == 2
+    assert len([statement for statement in statements if statement.startswith("UPDATE")]) == 1
+    assert stored[1] is not None and stored[2] is None and stored[3] is not None
+    assert pending_logins == {}
+
+def test_failed_flush_keeps_logins_buffered(tmp_path, pending_logins, monkeypatch):
+    from datetime import datetime
+    older, newer = datetime(2024, 1, 1), datetime(2024, 1, 2)
+
+    async def scenario(db):
+        async def failing_execute(*args, **kwargs):
+            # A login that arrives while the flush is running
+            pending_logins[1] = newer
+            raise RuntimeError("database is down")
+        monkeypatch.setattr(db, "execute", failing_execute)
+        pending_logins.update({1: older, 2: older})
+        with pytest.raises(RuntimeError):
+            await crud.flush_last_logins(db)
+
+    run_with_session(tmp_path, scenario)
+
+    assert pending_logins == {1: newer, 2: older}
+
+def test_cancelled_flusher_writes_pending_logins(tmp_path, pending_logins, monkeypatch):
+    import database
+
+    async def scenario(db):
+        await add_users(db, 2)
+        monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(db.bind, expire_on_commit=False))
+        flusher = asyncio.create_task(crud.run_last_login_flusher(interval=3600))
+        await asyncio.sleep(0)
+        crud.record_login(2)
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        return await last_logins(db)
+
+    stored = run_with_session(tmp_path, scenario)
+
+    assert stored[1] is None and stored[2] is not None
+    assert pending_logins == {}
+
+@pytest.fixture
+def users_client(tmp_path, monkeypatch):
+    """Client for the /users endpoints on a file database holding users 1 to 5."""
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.pool import NullPool
+    import database, main
+
+    path = tmp_path / "users.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.User), [
+            {"email": f"user{i}@example.com", "name": f"User {i}", "hashed_password": "x"} for i in range(1, 6)
+        ])
+    engine.dispose()
+
+    # NullPool, since the test client runs the app on its own event loop
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessions)
+    monkeypatch.setitem(main.app.dependency_overrides, auth.get_current_user, lambda: None)
+    return TestClient(main.app)
+
+def test_user_pages_follow_the_cursor_to_the_end(users_client):
+    pages = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = users_client.get("/users", params=params).json()
+        pages.append([user["id"] for user in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == [[1, 2], [3, 4], [5]]
+
+def test_full_last_page_is_followed_by_an_empty_one(users_client):
+    page = users_client.get("/users", params={"limit": 5}).json()
+    assert [user["id"] for user in page["items"]] == [1, 2, 3, 4, 5]
+
+    last = users_client.get("/users", params={"limit": 5, "cursor": page["next_cursor"]}).json()
+    assert last == {"items": [], "next_cursor": None}
+
+@pytest.mark.parametrize("cursor", ["not base64!", "dXNlcjp4", "b3RoZXI6MQ", crud.encode_cursor(1)[:-1] + "_"])
+def test_malformed_cursors_answer_400(users_client, cursor):
+    response = users_client.get("/users", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_user_stream_reads_after_the_handler_returns(users_client):
+    # The session from the yield dependency must stay open while the body is streamed
+    response = users_client.get("/users", params={"stream": True, "cursor": crud.encode_cursor(2)})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [line["id"] for line in map(json.loads, response.text.splitlines())] == [3, 4, 5]
@@ -0,0 +1,44 @@
+"""Row-by-row versus columnar analysis of synthetic orders.
+
+Analyzes the same OrderBatch with analyze_customers and with the NumPy
+engine at each order count, and checks that the reports are identical:
+
+    python benchmarks/bench_columnar.py --orders 10000 1000000 10000000
+
+The customer list repeats one id, so the check also covers duplicate
+customers. Columnar time is split into building the columns and the
+analysis itself.
+"""
+import argparse
+import time
+from synthetic import NOW, iter_orders, make_customers
+from customer_analysis import Customer, OrderBatch, analyze_customers
+from columnar import analyze_customers_columnar, to_columns
+
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--customers", type=int, default=100_000)
+    args = parser.parse_args()
+
+    customer_list = make_customers(args.customers)
+    first = customer_list[0]
+    customer_list.append(Customer(first.customer_id, "Renamed customer", "renamed@example.com"))
+
+    print(f"{args.customers:,} customers")
+    for order_count in args.orders:
+        batch = OrderBatch.from_orders(iter_orders(order_count, args.customers))
+        rows, row_report = timed(lambda: analyze_customers(customer_list, batch, NOW))
+        convert, columns = timed(lambda: to_columns(batch))
+        analyze, columnar_report = timed(lambda: analyze_customers_columnar(customer_list, columns, NOW))
+        assert columnar_report == row_report, f"{order_count:,} orders: reports differ"
+        print(
+            f"{order_count:>12,} orders  rows {rows:7.2f} s  columnar {convert + analyze:7.2f} s "
+            f"(columns {convert:5.2f} s)  speedup {rows / (convert + analyze):5.1f}x"
+        )
+        del batch, columns
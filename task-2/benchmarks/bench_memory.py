@@ -0,0 +1,53 @@
+"""Memory per order held as Order objects versus in an OrderBatch.
+
+Each representation is built from its own stream of orders, so no strings
+are shared between them, and sized by walking every object it references:
+
+    python benchmarks/bench_memory.py --orders 5000000
+"""
+import argparse
+import sys
+from synthetic import iter_orders
+from customer_analysis import OrderBatch
+
+def deep_size(root) -> int:
+    """Bytes of every object reachable from root, each counted once."""
+    seen = set()
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        else:
+            stack.extend(getattr(obj, name) for name in getattr(type(obj), "__slots__", ()) if hasattr(obj, name))
+    return size
+
+def measure(build) -> int:
+    result = build()
+    return deep_size(result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    args = parser.parse_args()
+
+    results = [
+        ("Order objects", measure(lambda: list(iter_orders(args.orders, args.customers)))),
+        ("OrderBatch with order ids", measure(
+            lambda: OrderBatch.from_orders(iter_orders(args.orders, args.customers), keep_order_ids=True)
+        )),
+        ("OrderBatch", measure(lambda: OrderBatch.from_orders(iter_orders(args.orders, args.customers)))),
+    ]
+    print(f"{args.orders:,} orders, {args.customers:,} customers")
+    baseline = results[0][1]
+    for name, size in results:
+        print(f"{name:<28} {size / 2**20:9.1f} MiB {size / args.orders:7.1f} B/order {baseline / size:5.1f}x")
@@ -0,0 +1,64 @@
+"""Speedup of the parallel drivers over a serial run.
+
+Times an in-memory OrderBatch and an order CSV file, each analyzed serially
+and with worker processes, and checks that every report is identical:
+
+    python benchmarks/bench_parallel.py --orders 1000000 --workers 8
+
+Speedup is bounded by the number of cores; on one core the parallel runs
+only show the overhead of sharding.
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from synthetic import NOW, iter_orders, make_customers
+from customer_analysis import (
+    OrderBatch,
+    analyze_customers,
+    analyze_customers_parallel,
+    analyze_order_file_parallel,
+    read_orders,
+)
+
+def write_csv(path: str, order_count: int, customer_count: int) -> None:
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["order_id", "customer_id", "amount", "category", "date"])
+        for order in iter_orders(order_count, customer_count):
+            writer.writerow([order.order_id, order.customer_id, order.amount, order.category, order.date.isoformat()])
+
+def timed(run):
+    start = time.perf_counter()
+    report = run()
+    return time.perf_counter() - start, report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    customer_list = make_customers(args.customers)
+    batch = OrderBatch.from_orders(iter_orders(args.orders, args.customers))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "orders.csv")
+        write_csv(path, args.orders, args.customers)
+        runs = [
+            ("OrderBatch", [
+                timed(lambda: analyze_customers(customer_list, batch, NOW)),
+                timed(lambda: analyze_customers_parallel(customer_list, batch, args.workers, NOW)),
+            ]),
+            ("CSV file", [
+                timed(lambda: analyze_customers(customer_list, read_orders(path), NOW)),
+                timed(lambda: analyze_order_file_parallel(customer_list, path, args.workers, NOW)),
+            ]),
+        ]
+
+    print(f"{args.orders:,} orders, {args.customers:,} customers, {args.workers} workers, {os.cpu_count()} CPUs")
+    reference = runs[0][1][0][1]
+    for name, ((serial, serial_report), (parallel, parallel_report)) in runs:
+        assert serial_report == reference and parallel_report == reference, f"{name}: reports differ"
+        print(f"{name:<12} serial {serial:7.2f} s  parallel {parallel:7.2f} s  speedup {serial / parallel:5.2f}x")
@@ -0,0 +1,30 @@
+"""Synthetic customers and orders for the benchmarks."""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from customer_analysis import Customer, Order
+
+CATEGORIES = ["Electronics", "Clothing", "Home & Kitchen", "Books", "Toys", "Sports", "Beauty", "Garden"]
+
+# Fixed reference time, so reports from different runs are comparable
+NOW = datetime(2024, 1, 1)
+
+def make_customers(count: int) -> List[Customer]:
+    return [Customer(f"C{i:07d}", f"Customer {i}", f"customer{i}@example.com") for i in range(count)]
+
+def iter_orders(count: int, customer_count: int, seed: int = 0) -> Iterator[Order]:
+    """Yield orders with fresh strings, amounts of 5-500 and dates within the last year."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield Order(
+            f"O{i:09d}",
+            f"C{rng.randrange(customer_count):07d}",
+            round(rng.uniform(5, 500), 2),
+            rng.choice(CATEGORIES),
+            NOW - timedelta(days=rng.randrange(365), seconds=rng.randrange(86400))
+        )
@@ -0,0 +1,126 @@
+"""Vectorized customer analysis over orders held as NumPy columns.
+
+Produces the same report as ``customer_analysis.analyze_customers``:
+
+    python customer_analysis.py --engine columnar
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import numpy as np
+from customer_analysis import (
+    ACTIVE_WINDOW,
+    MIN_TOTAL_SPENT,
+    Customer,
+    Order,
+    OrderBatch,
+    build_report_row,
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+class OrderColumns(NamedTuple):
+    """Orders as parallel arrays, with customer ids and categories as integer codes."""
+    customer_ids: List[str]  # code -> customer id
+    categories: List[str]  # code -> category
+    customer_codes: np.ndarray  # int64
+    category_codes: np.ndarray  # int64
+    amounts: np.ndarray  # float64
+    dates: np.ndarray  # datetime64[us]
+
+def to_columns(orders: Iterable[Order]) -> OrderColumns:
+    """Convert Order objects to columns; an OrderBatch is converted without a per-order loop.
+
+    The columns are copies, so a batch can still be appended to afterwards.
+    """
+    if isinstance(orders, OrderBatch):
+        return OrderColumns(
+            customer_ids=list(orders.customer_ids),
+            categories=list(orders.categories),
+            customer_codes=np.frombuffer(orders.customer_codes, dtype=np.intc).astype(np.int64),
+            category_codes=np.frombuffer(orders.category_codes, dtype=np.intc).astype(np.int64),
+            amounts=np.frombuffer(orders.amounts, dtype=np.float64).copy(),
+            dates=np.frombuffer(orders.timestamps, dtype=np.int64).view("datetime64[us]").copy()
+        )
+    customer_index: Dict[str, int] = {}
+    category_index: Dict[str, int] = {}
+    customer_codes, category_codes, amounts, dates = [], [], [], []
+    for order in orders:
+        customer_codes.append(customer_index.setdefault(order.customer_id, len(customer_index)))
+        category_codes.append(category_index.setdefault(order.category, len(category_index)))
+        amounts.append(order.amount)
+        dates.append(order.date)
+    return OrderColumns(
+        customer_ids=list(customer_index),
+        categories=list(category_index),
+        customer_codes=np.array(customer_codes, dtype=np.int64),
+        category_codes=np.array(category_codes, dtype=np.int64),
+        amounts=np.array(amounts, dtype=np.float64),
+        dates=np.array(dates, dtype="datetime64[us]")
+    )
+
+def analyze_customers_columnar(
+    customer_list: List[Customer],
+    columns: OrderColumns,
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """Build the customer report from order columns.
+
+    Sums use ``np.bincount``, which adds the weights of each bin in input
+    order, so totals and category spend are bit-for-bit the running sums of
+    the row-by-row engine.
+    """
+    # Like the row engine's dict, a repeated id keeps its first position and its last Customer
+    customers = list({customer.customer_id: customer for customer in customer_list}.values())
+    num_customers = len(customers)
+    num_categories = max(len(columns.categories), 1)
+    position = {customer.customer_id: i for i, customer in enumerate(customers)}
+
+    # Map order customer codes onto report positions (orders of unknown customers raise KeyError)
+    customer_position = np.array([position[cid] for cid in columns.customer_ids], dtype=np.int64)
+    owners = customer_position[columns.customer_codes]
+
+    order_counts = np.bincount(owners, minlength=num_customers)
+    totals = np.bincount(owners, weights=columns.amounts, minlength=num_customers)
+
+    dates = columns.dates.astype("datetime64[us]").view(np.int64)
+    last_purchase = np.full(num_customers, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last_purchase, owners, dates)
+    cutoff = np.datetime64((now or datetime.now()) - ACTIVE_WINDOW, "us").astype(np.int64)
+
+    # One entry per (customer, category) pair, ordered by customer and then by
+    # first occurrence so categoryWiseSpend keeps the row engine's key order
+    pairs, first_seen, pair_of_order = np.unique(
+        owners * num_categories + columns.category_codes,
+        return_index=True,
+        return_inverse=True
+    )
+    pair_counts = np.bincount(pair_of_order, minlength=len(pairs))
+    pair_spend = np.bincount(pair_of_order, weights=columns.amounts, minlength=len(pairs))
+    pair_owners = pairs // num_categories
+    pair_categories = pairs % num_categories
+    pair_order = np.lexsort((first_seen, pair_owners))
+    pair_owners = pair_owners[pair_order]
+    bounds = np.searchsorted(pair_owners, np.arange(num_customers + 1))
+
+    pair_categories = pair_categories[pair_order].tolist()
+    pair_counts = pair_counts[pair_order].tolist()
+    pair_spend = pair_spend[pair_order].tolist()
+    order_counts = order_counts.tolist()
+    totals_list = totals.tolist()
+    is_active = (last_purchase >= cutoff).tolist()
+    last_purchase = last_purchase.tolist()
+
+    report = []
+    for i in np.flatnonzero(totals >= MIN_TOTAL_SPENT).tolist():
+        start, end = bounds[i], bounds[i + 1]
+        category_names = [columns.categories[code] for code in pair_categories[start:end]]
+        report.append(build_report_row(
+            customers[i],
+            totals_list[i],
+            order_counts[i],
+            dict(zip(category_names, pair_counts[start:end])),
+            dict(zip(category_names, pair_spend[start:end])),
+            _EPOCH + timedelta(microseconds=last_purchase[i]),
+            is_active[i]
+        ))
+    return report
@@ -1,23 +1,120 @@
 from datetime import datetime, timedelta
-from typing import List, Dict
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional
+import argparse
+import csv
 import json
-from collections import defaultdict
+import os
+import sys
+import zlib
 
 # Sample data structures
 class Customer:
+    __slots__ = ("customer_id", "name", "email")
+
     def __init__(self, customer_id: str, name: str, email: str):
-        self.customer_id = customer_id
+        self.customer_id = sys.intern(customer_id)
         self.name = name
         self.email = email
 
 class Order:
+    __slots__ = ("order_id", "customer_id", "amount", "category", "date")
+
     def __init__(self, order_id: str, customer_id: str, amount: float, category: str, date: datetime):
         self.order_id = order_id
-        self.customer_id = customer_id
+        # Interned so that all orders of a customer or category share one string
+        self.customer_id = sys.intern(customer_id)
         self.amount = amount
-        self.category = category
+        self.category = sys.intern(category)
         self.date = date
 
+_EPOCH = datetime(1970, 1, 1)
+
+class OrderBatch:
+    """Orders stored column-wise in typed arrays.
+
+    Customer ids and categories are kept once each and referenced by integer
+    codes, and dates as microseconds since the epoch, so an order takes 24
+    bytes. Order ids are not needed for the report and are only kept, as one
+    string per order, with ``keep_order_ids``. Dates must be naive datetimes.
+    Both analyze_customers and the columnar engine accept a batch directly.
+    """
+
+    __slots__ = (
+        "customer_ids", "categories", "order_ids",
+        "customer_codes", "category_codes", "amounts", "timestamps",
+        "_customer_index", "_category_index",
+    )
+
+    def __init__(self, keep_order_ids: bool = False):
+        self.customer_ids: List[str] = []  # code -> customer id
+        self.categories: List[str] = []  # code -> category
+        self.order_ids: Optional[List[str]] = [] if keep_order_ids else None
+        self.customer_codes = array("i")
+        self.category_codes = array("i")
+        self.amounts = array("d")
+        self.timestamps = array("q")
+        self._customer_index: Dict[str, int] = {}
+        self._category_index: Dict[str, int] = {}
+
+    @classmethod
+    def from_orders(cls, order_stream: Iterable[Order], keep_order_ids: bool = False) -> "OrderBatch":
+        batch = cls(keep_order_ids)
+        for order in order_stream:
+            batch.append(order.order_id, order.customer_id, order.amount, order.category, order.date)
+        return batch
+
+    def append(self, order_id: Optional[str], customer_id: str, amount: float, category: str, date: datetime) -> None:
+        if self.order_ids is not None:
+            self.order_ids.append(order_id)
+        self.customer_codes.append(self._code(self._customer_index, self.customer_ids, customer_id))
+        self.category_codes.append(self._code(self._category_index, self.categories, category))
+        self.amounts.append(amount)
+        self.timestamps.append((date - _EPOCH) // timedelta(microseconds=1))
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __iter__(self) -> Iterator[Order]:
+        """Yield the orders as Order objects (with order_id None unless order ids are kept)."""
+        order_ids = self.order_ids if self.order_ids is not None else repeat(None)
+        for order_id, customer_code, category_code, amount, timestamp in zip(
+            order_ids, self.customer_codes, self.category_codes, self.amounts, self.timestamps
+        ):
+            yield Order(
+                order_id,
+                self.customer_ids[customer_code],
+                amount,
+                self.categories[category_code],
+                _EPOCH + timedelta(microseconds=timestamp)
+            )
+
+    def __getstate__(self):
+        # The lookup indexes are rebuilt on unpickling, so sending a batch to
+        # another process costs little more than its arrays
+        return (
+            self.customer_ids, self.categories, self.order_ids,
+            self.customer_codes, self.category_codes, self.amounts, self.timestamps
+        )
+
+    def __setstate__(self, state) -> None:
+        (
+            self.customer_ids, self.categories, self.order_ids,
+            self.customer_codes, self.category_codes, self.amounts, self.timestamps
+        ) = state
+        self._customer_index = {customer_id: code for code, customer_id in enumerate(self.customer_ids)}
+        self._category_index = {category: code for code, category in enumerate(self.categories)}
+
+    @staticmethod
+    def _code(index: Dict[str, int], values: List[str], value: str) -> int:
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+        return code
+
 # Sample data
 customers = [
     Customer("C001", "John Smith", "john@email.com"),
@@ -69,6 +166,12 @@ orders = [
     Order("O019", "C008", 900.0, "Electronics", datetime.now() - timedelta(days=5)),
 ]
 
+# Customers who spent less than this are left out of the report
+MIN_TOTAL_SPENT = 500
+
+# Customers with a purchase within this window are active
+ACTIVE_WINDOW = timedelta(days=180)
+
 def get_loyalty_tier(total_spent: float):
     if total_spent > 3000:
         return "Gold"
@@ -77,69 +180,352 @@ def get_loyalty_tier(total_spent: float):
     else:
         return "Bronze"
 
-def analyze_customers():
-    customer_data = {}
-    six_months_ago = datetime.now() - timedelta(days=180)
-    
-    # Initialize customer data
-    for customer in customers:
-        customer_data[customer.customer_id] = {
-            "customerId": customer.customer_id,
-            "name": customer.name,
-            "email": customer.email,
-            "totalSpent": 0.0,
-            "orders": [],
-            "categorySpend": defaultdict(float),
-            "lastPurchaseDate": None,
-            "isActive": False
-        }
-    
-    # Process orders
-    for order in orders:
-        customer = customer_data[order.customer_id]
-        customer["totalSpent"] += order.amount
-        customer["orders"].append(order)
-        customer["categorySpend"][order.category] += order.amount
-        
-        if customer["lastPurchaseDate"] is None or order.date > customer["lastPurchaseDate"]:
-            customer["lastPurchaseDate"] = order.date
-            
-        if order.date >= six_months_ago:
-            customer["isActive"] = True
-    
-    # Generate report
-    report = []
-    for customer_id, data in customer_data.items():
-        if data["totalSpent"] < 500:  # Exclude low-spending customers
+def get_favorite_category(category_counts: Dict[str, int]) -> str:
+    """Most frequent category, earliest alphabetically in case of ties."""
+    max_count = max(category_counts.values())
+    favorite_categories = [cat for cat, count in category_counts.items() if count == max_count]
+    return min(favorite_categories)
+
+def build_report_row(
+    customer: Customer,
+    total_spent: float,
+    order_count: int,
+    category_counts: Dict[str, int],
+    category_spend: Dict[str, float],
+    last_purchase_date: datetime,
+    is_active: bool
+) -> Dict:
+    """Format one customer's aggregates as a report row."""
+    return {
+        "customerId": customer.customer_id,
+        "name": customer.name,
+        "email": customer.email,
+        "totalSpent": round(total_spent, 2),
+        "averageOrderValue": round(total_spent / order_count, 2),
+        "favoriteCategory": get_favorite_category(category_counts),
+        "loyaltyTier": get_loyalty_tier(total_spent),
+        "lastPurchaseDate": last_purchase_date.strftime("%Y-%m-%d"),
+        "isActive": is_active,
+        "categoryWiseSpend": dict(category_spend)
+    }
+
+class CustomerAggregate:
+    """Running totals for one customer's orders.
+
+    Holds a fixed amount of state per customer and category, however many
+    orders are added.
+    """
+
+    __slots__ = ("total_spent", "order_count", "category_counts", "category_spend", "last_purchase_date")
+
+    def __init__(self):
+        self.total_spent = 0.0
+        self.order_count = 0
+        self.category_counts: Dict[str, int] = {}
+        self.category_spend: Dict[str, float] = {}
+        self.last_purchase_date: Optional[datetime] = None
+
+    def add(self, order: Order) -> None:
+        self.add_amount(order.category, order.amount)
+        self.add_date(order.date)
+
+    def add_amount(self, category: str, amount: float) -> None:
+        self.total_spent += amount
+        self.order_count += 1
+        self.category_counts[category] = self.category_counts.get(category, 0) + 1
+        self.category_spend[category] = self.category_spend.get(category, 0.0) + amount
+
+    def add_date(self, date: datetime) -> None:
+        if self.last_purchase_date is None or date > self.last_purchase_date:
+            self.last_purchase_date = date
+
+    def __getstate__(self):
+        # A plain tuple pickles several times faster than the default for slotted classes
+        return (self.total_spent, self.order_count, self.category_counts, self.category_spend, self.last_purchase_date)
+
+    def __setstate__(self, state) -> None:
+        (
+            self.total_spent, self.order_count, self.category_counts, self.category_spend, self.last_purchase_date
+        ) = state
+
+    def merge(self, other: "CustomerAggregate") -> None:
+        """Fold in the aggregate of orders that came after this one's."""
+        self.total_spent += other.total_spent
+        self.order_count += other.order_count
+        for category, count in other.category_counts.items():
+            self.category_counts[category] = self.category_counts.get(category, 0) + count
+        for category, spend in other.category_spend.items():
+            self.category_spend[category] = self.category_spend.get(category, 0.0) + spend
+        if self.last_purchase_date is None or (
+            other.last_purchase_date is not None and other.last_purchase_date > self.last_purchase_date
+        ):
+            self.last_purchase_date = other.last_purchase_date
+
+class OrderAggregator:
+    """Single-pass customer analysis over a stream of orders.
+
+    Orders can come from any iterable, such as a file reader or a database
+    cursor; only the per-customer aggregates are kept in memory.
+    """
+
+    def __init__(self, customer_list: Iterable[Customer]):
+        self.customers = {customer.customer_id: customer for customer in customer_list}
+        self.aggregates: Dict[str, CustomerAggregate] = {}
+
+    def add(self, order: Order) -> None:
+        self._aggregate(order.customer_id).add(order)
+
+    def consume(self, order_stream: Iterable[Order]) -> "OrderAggregator":
+        """Add every order from an iterable or an OrderBatch."""
+        if isinstance(order_stream, OrderBatch):
+            return self._consume_batch(order_stream)
+        add = self.add
+        for order in order_stream:
+            add(order)
+        return self
+
+    def _consume_batch(self, batch: OrderBatch) -> "OrderAggregator":
+        _add_batch(batch, [self._aggregate(customer_id) for customer_id in batch.customer_ids])
+        return self
+
+    def _aggregate(self, customer_id: str) -> CustomerAggregate:
+        aggregate = self.aggregates.get(customer_id)
+        if aggregate is None:
+            if customer_id not in self.customers:
+                raise KeyError(customer_id)
+            aggregate = self.aggregates[customer_id] = CustomerAggregate()
+        return aggregate
+
+    def merge(self, partial: Dict[str, CustomerAggregate]) -> "OrderAggregator":
+        """Fold in per-customer aggregates computed elsewhere, such as by aggregate_orders."""
+        for customer_id, other in partial.items():
+            aggregate = self.aggregates.get(customer_id)
+            if aggregate is None:
+                if customer_id not in self.customers:
+                    raise KeyError(customer_id)
+                self.aggregates[customer_id] = other
+            else:
+                aggregate.merge(other)
+        return self
+
+    def report_row(self, customer_id: str, six_months_ago: datetime) -> Optional[Dict]:
+        """Report row for one customer, or None if the customer is excluded."""
+        aggregate = self.aggregates.get(customer_id)
+        if aggregate is None or aggregate.total_spent < MIN_TOTAL_SPENT:  # Exclude low-spending customers
+            return None
+        return build_report_row(
+            self.customers[customer_id],
+            aggregate.total_spent,
+            aggregate.order_count,
+            aggregate.category_counts,
+            aggregate.category_spend,
+            aggregate.last_purchase_date,
+            aggregate.last_purchase_date >= six_months_ago
+        )
+
+    def report(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Build the report, in customer order, from the orders seen so far."""
+        six_months_ago = (now or datetime.now()) - ACTIVE_WINDOW
+        report = []
+        for customer_id in self.customers:
+            row = self.report_row(customer_id, six_months_ago)
+            if row is not None:
+                report.append(row)
+        return report
+
+def analyze_customers(
+    customer_list: Optional[List[Customer]] = None,
+    order_list: Optional[Iterable[Order]] = None,
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """Build the report for the given customers and orders (the sample data by default).
+
+    Orders can be any iterable of Order objects or an OrderBatch.
+    """
+    customer_list = customers if customer_list is None else customer_list
+    order_list = orders if order_list is None else order_list
+    return OrderAggregator(customer_list).consume(order_list).report(now)
+
+def aggregate_orders(order_stream: Iterable[Order]) -> Dict[str, CustomerAggregate]:
+    """Aggregate orders per customer id, without checking them against a customer list."""
+    aggregates: Dict[str, CustomerAggregate] = {}
+    for order in order_stream:
+        aggregate = aggregates.get(order.customer_id)
+        if aggregate is None:
+            aggregate = aggregates[order.customer_id] = CustomerAggregate()
+        aggregate.add(order)
+    return aggregates
+
+def _add_batch(batch: OrderBatch, aggregates: List[Optional[CustomerAggregate]]) -> None:
+    """Add a batch's orders to the aggregates indexed by customer code, skipping codes mapped to None."""
+    # Works on the codes directly; only each customer's latest timestamp becomes a datetime
+    last_timestamps = [None] * len(aggregates)
+    categories = batch.categories
+    for customer_code, category_code, amount, timestamp in zip(
+        batch.customer_codes, batch.category_codes, batch.amounts, batch.timestamps
+    ):
+        aggregate = aggregates[customer_code]
+        if aggregate is None:
             continue
-            
-        # Calculate average order value
-        avg_order_value = data["totalSpent"] / len(data["orders"])
-        
-        # Find favorite category (earliest alphabetically in case of ties)
-        category_counts = defaultdict(int)
-        for order in data["orders"]:
-            category_counts[order.category] += 1
-        
-        max_count = max(category_counts.values())
-        favorite_categories = [cat for cat, count in category_counts.items() if count == max_count]
-        favorite_category = min(favorite_categories)  # Select earliest alphabetically
-        
-        report.append({
-            "customerId": data["customerId"],
-            "name": data["name"],
-            "email": data["email"],
-            "totalSpent": round(data["totalSpent"], 2),
-            "averageOrderValue": round(avg_order_value, 2),
-            "favoriteCategory": favorite_category,
-            "loyaltyTier": get_loyalty_tier(data["totalSpent"]),
-            "lastPurchaseDate": data["lastPurchaseDate"].strftime("%Y-%m-%d"),
-            "isActive": data["isActive"],
-            "categoryWiseSpend": dict(data["categorySpend"])
-        })
-    
-    return report
+        aggregate.add_amount(categories[category_code], amount)
+        last_timestamp = last_timestamps[customer_code]
+        if last_timestamp is None or timestamp > last_timestamp:
+            last_timestamps[customer_code] = timestamp
+    for aggregate, last_timestamp in zip(aggregates, last_timestamps):
+        if last_timestamp is not None:
+            aggregate.add_date(_EPOCH + timedelta(microseconds=last_timestamp))
+
+def get_shard(customer_id: str, shard_count: int) -> int:
+    """Stable shard number for a customer id."""
+    return zlib.crc32(customer_id.encode()) % shard_count
+
+def _aggregate_batch_shard(batch: OrderBatch, shard: int, shard_count: int) -> Dict[str, CustomerAggregate]:
+    """Aggregate the orders of one shard's customers, skipping all others."""
+    aggregates = [
+        CustomerAggregate() if get_shard(customer_id, shard_count) == shard else None
+        for customer_id in batch.customer_ids
+    ]
+    _add_batch(batch, aggregates)
+    return {
+        customer_id: aggregate
+        for customer_id, aggregate in zip(batch.customer_ids, aggregates)
+        if aggregate is not None and aggregate.order_count
+    }
+
+def _read_shard_records(path: str, shard: int, shard_count: int) -> Iterator[Dict]:
+    """Records of one shard's customers from an order file.
+
+    CSV rows of other customers are skipped without being turned into records.
+    """
+    shards: Dict[str, int] = {}
+
+    def in_shard(customer_id: str) -> bool:
+        customer_shard = shards.get(customer_id)
+        if customer_shard is None:
+            customer_shard = shards[customer_id] = get_shard(customer_id, shard_count)
+        return customer_shard == shard
+
+    if not path.endswith(".csv"):
+        yield from (record for record in _read_records(path) if in_shard(record["customer_id"]))
+        return
+    with open(path, newline="") as file:
+        rows = csv.reader(file)
+        header = next(rows, None)
+        if header is None:
+            return
+        column = header.index("customer_id")
+        for row in rows:
+            if row and in_shard(row[column]):
+                yield dict(zip(header, row))
+
+def _aggregate_file_shard(path: str, shard: int, shard_count: int) -> Dict[str, CustomerAggregate]:
+    return aggregate_orders(map(_parse_order, _read_shard_records(path, shard, shard_count)))
+
+def _merge_shards(customer_list: List[Customer], job, source, workers: int, now: Optional[datetime]) -> List[Dict]:
+    """Run job(source, shard, workers) for every shard in worker processes and report on the merged partials."""
+    aggregator = OrderAggregator(customer_list)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(job, repeat(source, workers), range(workers), repeat(workers, workers)):
+            aggregator.merge(partial)
+    return aggregator.report(now)
+
+def analyze_customers_parallel(
+    customer_list: List[Customer],
+    order_stream: Iterable[Order],
+    workers: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """Build the report by aggregating shards of the orders in worker processes.
+
+    Orders are sharded by customer id, so each customer's orders are summed
+    in their original order by a single worker. Merging the disjoint
+    partials is then exact, and the report matches analyze_customers.
+
+    Every worker receives the orders as one OrderBatch, which pickles as a
+    few flat arrays, and aggregates only its own shard. Other iterables are
+    converted to a batch first; for orders in a file, analyze_order_file_parallel
+    avoids reading them in this process at all.
+    """
+    workers = workers or os.cpu_count() or 1
+    batch = order_stream if isinstance(order_stream, OrderBatch) else OrderBatch.from_orders(order_stream)
+    return _merge_shards(customer_list, _aggregate_batch_shard, batch, workers, now)
+
+def analyze_order_file_parallel(
+    customer_list: List[Customer],
+    path: str,
+    workers: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """Like analyze_customers_parallel, for orders in a .csv or .jsonl file.
+
+    Each worker reads the file itself and parses only its own shard's
+    orders, so no orders are sent between processes.
+    """
+    workers = workers or os.cpu_count() or 1
+    return _merge_shards(customer_list, _aggregate_file_shard, path, workers, now)
+
+def _read_records(path: str) -> Iterator[Dict]:
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+def read_customers(path: str) -> Iterator[Customer]:
+    """Read customers from a .csv or .jsonl file with customer_id, name and email fields."""
+    for record in _read_records(path):
+        yield Customer(record["customer_id"], record["name"], record["email"])
+
+def _parse_date(value: str) -> datetime:
+    """Parse an ISO 8601 date as a naive local datetime, converting any UTC offset to local time."""
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
+
+def _parse_order(record: Dict) -> Order:
+    return Order(
+        record["order_id"],
+        record["customer_id"],
+        float(record["amount"]),
+        record["category"],
+        _parse_date(record["date"])
+    )
+
+def read_orders(path: str) -> Iterator[Order]:
+    """Lazily read orders from a .csv or .jsonl file.
+
+    Records need order_id, customer_id, amount, category and an ISO 8601 date.
+    Dates without a UTC offset are taken as local time, like the default
+    ``now`` of ``datetime.now()``; dates with one are converted to naive
+    local time, so all of them compare with each other and with ``now``.
+    """
+    return map(_parse_order, _read_records(path))
 
 if __name__ == "__main__":
-    report = analyze_customers()
-    print(json.dumps(report, indent=2)) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the customer analysis report.")
+    parser.add_argument(
+        "--engine",
+        choices=["python", "columnar"],
+        default="python",
+        help="aggregation engine; columnar requires NumPy"
+    )
+    parser.add_argument("--workers", type=int, help="aggregate orders in this many processes (python engine)")
+    parser.add_argument("--customers", help="CSV or JSON Lines file of customers (default: sample data)")
+    parser.add_argument("--orders", help="CSV or JSON Lines file of orders (default: sample data)")
+    args = parser.parse_args()
+
+    customer_list = list(read_customers(args.customers)) if args.customers else customers
+    order_stream = read_orders(args.orders) if args.orders else orders
+    if args.engine == "columnar":
+        import columnar
+        report = columnar.analyze_customers_columnar(customer_list, columnar.to_columns(order_stream))
+    elif args.workers and args.orders:
+        report = analyze_order_file_parallel(customer_list, args.orders, args.workers)
+    elif args.workers:
+        report = analyze_customers_parallel(customer_list, order_stream, args.workers)
+    else:
+        report = analyze_customers(customer_list, order_stream)
+    print(json.dumps(report, indent=2)) 
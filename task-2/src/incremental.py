@@ -0,0 +1,181 @@
+"""Incremental customer report maintenance.
+
+Keeps per-customer aggregates in a state file and applies only new orders,
+printing the report rows that changed. The ids of applied orders are kept
+in the state file too, so running the same order file again changes nothing:
+
+    python incremental.py --state report_state.json --customers customers.csv --orders new_orders.csv
+"""
+import argparse
+import heapq
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from customer_analysis import (
+    ACTIVE_WINDOW,
+    Customer,
+    CustomerAggregate,
+    Order,
+    OrderAggregator,
+    read_customers,
+    read_orders,
+)
+
+class ReportDelta(NamedTuple):
+    """Report rows changed by an update."""
+    changed: List[Dict]  # new or updated rows, in customer order
+    removed: List[str]  # ids of customers no longer in the report
+
+class IncrementalReport:
+    """Customer report that is updated with new orders instead of being rebuilt.
+
+    Besides new orders, an update also picks up customers whose last purchase
+    has left the activity window. Active customers are kept in a min-heap by
+    last purchase date, so only those that aged out are looked at.
+
+    Orders are applied at most once: the ids of applied orders are
+    remembered, and orders with an id already seen are skipped, so an update
+    retried after a crash does not count them twice. Every order therefore
+    needs an order_id.
+    """
+
+    def __init__(
+        self,
+        customer_list: Iterable[Customer],
+        aggregates: Optional[Dict[str, CustomerAggregate]] = None,
+        applied_order_ids: Iterable[str] = ()
+    ):
+        self.aggregator = OrderAggregator(customer_list)
+        if aggregates:
+            self.aggregator.merge(aggregates)
+        self.applied_order_ids: Set[str] = set(applied_order_ids)
+        self.as_of: Optional[datetime] = None
+        self.rows: Dict[str, Dict] = {}
+        self._positions = {customer_id: i for i, customer_id in enumerate(self.aggregator.customers)}
+        # (last purchase date, customer id) of customers counted as active;
+        # entries made stale by a newer purchase are skipped when popped
+        self._active: List[Tuple[datetime, str]] = []
+        self._active_dates: Dict[str, datetime] = {}
+
+    def update(self, new_orders: Iterable[Order] = (), now: Optional[datetime] = None) -> ReportDelta:
+        """Apply orders not applied before and return the rows that changed as of now."""
+        now = now or datetime.now()
+        six_months_ago = now - ACTIVE_WINDOW
+
+        touched: Set[str] = set()
+        if self.as_of is None:
+            touched.update(self.aggregator.aggregates)
+        for order in new_orders:
+            if order.order_id is None:
+                raise ValueError("orders need an order_id to be applied exactly once")
+            if order.order_id in self.applied_order_ids:
+                continue
+            self.aggregator.add(order)
+            self.applied_order_ids.add(order.order_id)
+            touched.add(order.customer_id)
+
+        # Customers whose last purchase is now outside the activity window
+        while self._active and self._active[0][0] < six_months_ago:
+            last_purchase_date, customer_id = heapq.heappop(self._active)
+            if self._active_dates.get(customer_id) == last_purchase_date:
+                del self._active_dates[customer_id]
+                touched.add(customer_id)
+
+        changed, removed = [], []
+        for customer_id in sorted(touched, key=self._positions.__getitem__):
+            last_purchase_date = self.aggregator.aggregates[customer_id].last_purchase_date
+            if last_purchase_date >= six_months_ago and self._active_dates.get(customer_id) != last_purchase_date:
+                self._active_dates[customer_id] = last_purchase_date
+                heapq.heappush(self._active, (last_purchase_date, customer_id))
+
+            row = self.aggregator.report_row(customer_id, six_months_ago)
+            previous = self.rows.get(customer_id)
+            if row == previous:
+                continue
+            if row is None:
+                del self.rows[customer_id]
+                removed.append(customer_id)
+            else:
+                self.rows[customer_id] = row
+                changed.append(row)
+
+        if len(self._active) > 2 * len(self._active_dates):
+            self._active = [(date, customer_id) for customer_id, date in self._active_dates.items()]
+            heapq.heapify(self._active)
+        self.as_of = now
+        return ReportDelta(changed, removed)
+
+    def report(self) -> List[Dict]:
+        """The full report as of the last update."""
+        return [self.rows[customer_id] for customer_id in self.aggregator.customers if customer_id in self.rows]
+
+    def save(self, path: str) -> None:
+        """Write the aggregates to a state file, replacing it atomically."""
+        state = {
+            "asOf": self.as_of.isoformat() if self.as_of else None,
+            "customers": {
+                customer_id: _dump_aggregate(aggregate)
+                for customer_id, aggregate in self.aggregator.aggregates.items()
+            },
+            "appliedOrderIds": sorted(self.applied_order_ids)
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(state, tmp_file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, customer_list: Iterable[Customer]) -> "IncrementalReport":
+        """Restore a report from a state file, with its rows as of the saved time."""
+        with open(path) as state_file:
+            state = json.load(state_file)
+        aggregates = {
+            customer_id: _load_aggregate(data) for customer_id, data in state["customers"].items()
+        }
+        # State files written before applied orders were recorded have no ids
+        report = cls(customer_list, aggregates, state.get("appliedOrderIds", ()))
+        if state["asOf"]:
+            report.update(now=datetime.fromisoformat(state["asOf"]))
+        return report
+
+def _dump_aggregate(aggregate: CustomerAggregate) -> Dict:
+    # Floats are written with repr precision, so sums survive a round trip exactly
+    return {
+        "totalSpent": aggregate.total_spent,
+        "orderCount": aggregate.order_count,
+        "categoryCounts": aggregate.category_counts,
+        "categorySpend": aggregate.category_spend,
+        "lastPurchaseDate": aggregate.last_purchase_date.isoformat()
+    }
+
+def _load_aggregate(data: Dict) -> CustomerAggregate:
+    aggregate = CustomerAggregate()
+    aggregate.total_spent = data["totalSpent"]
+    aggregate.order_count = data["orderCount"]
+    aggregate.category_counts = data["categoryCounts"]
+    aggregate.category_spend = data["categorySpend"]
+    aggregate.last_purchase_date = datetime.fromisoformat(data["lastPurchaseDate"])
+    return aggregate
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the customer report with new orders.")
+    parser.add_argument("--state", required=True, help="state file, created on the first run")
+    parser.add_argument("--customers", required=True, help="CSV or JSON Lines file of customers")
+    parser.add_argument("--orders", required=True, help="CSV or JSON Lines file of orders; already applied ones are skipped")
+    args = parser.parse_args()
+
+    customer_list = list(read_customers(args.customers))
+    if os.path.exists(args.state):
+        report = IncrementalReport.load(args.state, customer_list)
+    else:
+        report = IncrementalReport(customer_list)
+    delta = report.update(read_orders(args.orders))
+    report.save(args.state)
+    print(json.dumps(delta._asdict(), indent=2))
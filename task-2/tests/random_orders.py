@@ -0,0 +1,33 @@
+"""Small random customer lists and orders for comparing the engines."""
+import random
+from datetime import datetime, timedelta
+from typing import List
+from customer_analysis import Customer, Order
+
+CATEGORIES = ["Electronics", "Clothing", "Books", "Toys"]
+
+# Fixed reference time, so the activity window does not depend on the clock
+NOW = datetime(2024, 1, 1)
+
+def make_customers(count: int, seed: int = 0, repeats: int = 0) -> List[Customer]:
+    """Customers C0, C1, ..., followed by ``repeats`` renamed copies of random earlier ids."""
+    rng = random.Random(seed)
+    customers = [Customer(f"C{i}", f"Customer {i}", f"c{i}@example.com") for i in range(count)]
+    for i in range(repeats):
+        customer_id = rng.choice(customers[:count]).customer_id
+        customers.append(Customer(customer_id, f"Renamed {i}", f"renamed{i}@example.com"))
+    return customers
+
+def make_orders(count: int, customer_count: int, seed: int = 0, first_id: int = 0) -> List[Order]:
+    """Orders with few distinct amounts and dates, so category counts, spend and dates tie often."""
+    rng = random.Random(seed)
+    return [
+        Order(
+            f"O{first_id + i}",
+            f"C{rng.randrange(customer_count)}",
+            rng.choice([0.1, 0.2, 99.99, 250.0, 333.33, 1200.5]),
+            rng.choice(CATEGORIES),
+            NOW - timedelta(days=rng.choice([0, 30, 179, 180, 181, 400]))
+        )
+        for i in range(count)
+    ]
@@ -0,0 +1,118 @@
+"""Every analysis path must produce the report of the original implementation."""
+import csv
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+import pytest
+from customer_analysis import (
+    ACTIVE_WINDOW,
+    OrderBatch,
+    analyze_customers,
+    analyze_customers_parallel,
+    analyze_order_file_parallel,
+    get_loyalty_tier,
+    read_orders,
+)
+from incremental import IncrementalReport
+from random_orders import NOW, make_customers, make_orders
+
+def baseline_report(customer_list, order_list, now: datetime) -> List[Dict]:
+    """The report as the original analyze_customers built it, with now as a parameter."""
+    customer_data = {}
+    six_months_ago = now - ACTIVE_WINDOW
+    for customer in customer_list:
+        customer_data[customer.customer_id] = {
+            "customer": customer, "totalSpent": 0.0, "orders": [],
+            "categorySpend": defaultdict(float), "lastPurchaseDate": None, "isActive": False
+        }
+    for order in order_list:
+        data = customer_data[order.customer_id]
+        data["totalSpent"] += order.amount
+        data["orders"].append(order)
+        data["categorySpend"][order.category] += order.amount
+        if data["lastPurchaseDate"] is None or order.date > data["lastPurchaseDate"]:
+            data["lastPurchaseDate"] = order.date
+        if order.date >= six_months_ago:
+            data["isActive"] = True
+
+    report = []
+    for data in customer_data.values():
+        if data["totalSpent"] < 500:
+            continue
+        category_counts = defaultdict(int)
+        for order in data["orders"]:
+            category_counts[order.category] += 1
+        max_count = max(category_counts.values())
+        report.append({
+            "customerId": data["customer"].customer_id,
+            "name": data["customer"].name,
+            "email": data["customer"].email,
+            "totalSpent": round(data["totalSpent"], 2),
+            "averageOrderValue": round(data["totalSpent"] / len(data["orders"]), 2),
+            "favoriteCategory": min(cat for cat, count in category_counts.items() if count == max_count),
+            "loyaltyTier": get_loyalty_tier(data["totalSpent"]),
+            "lastPurchaseDate": data["lastPurchaseDate"].strftime("%Y-%m-%d"),
+            "isActive": data["isActive"],
+            "categoryWiseSpend": dict(data["categorySpend"])
+        })
+    return report
+
+def write_csv(path: str, orders) -> None:
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["order_id", "customer_id", "amount", "category", "date"])
+        for order in orders:
+            writer.writerow([order.order_id, order.customer_id, repr(order.amount), order.category, order.date.isoformat()])
+
+def incremental(customer_list, orders, now):
+    report = IncrementalReport(customer_list)
+    for start in range(0, len(orders), 37):
+        report.update(orders[start:start + 37], now)
+    report.update(now=now)
+    return report.report()
+
+def columnar(customer_list, orders, now):
+    pytest.importorskip("numpy")
+    from columnar import analyze_customers_columnar, to_columns
+    return analyze_customers_columnar(customer_list, to_columns(orders), now)
+
+def columnar_batch(customer_list, orders, now):
+    return columnar(customer_list, OrderBatch.from_orders(orders), now)
+
+ENGINES = {
+    "rows": lambda customer_list, orders, now: analyze_customers(customer_list, orders, now),
+    "generator": lambda customer_list, orders, now: analyze_customers(customer_list, iter(orders), now),
+    "batch": lambda customer_list, orders, now: analyze_customers(customer_list, OrderBatch.from_orders(orders), now),
+    "batch with ids": lambda customer_list, orders, now: analyze_customers(
+        customer_list, OrderBatch.from_orders(orders, keep_order_ids=True), now
+    ),
+    "parallel": lambda customer_list, orders, now: analyze_customers_parallel(customer_list, orders, 3, now),
+    "incremental": incremental,
+    "columnar": columnar,
+    "columnar batch": columnar_batch,
+}
+
+CASES = {
+    "random": (make_customers(30), make_orders(500, 30, seed=3)),
+    "repeated ids": (make_customers(30, seed=4, repeats=5), make_orders(500, 30, seed=4)),
+    "many ties": (make_customers(3), make_orders(60, 3, seed=5)),
+    "no orders": (make_customers(5), []),
+    "no customers": ([], []),
+}
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_match_the_original_report(engine, case):
+    customer_list, orders = CASES[case]
+
+    assert ENGINES[engine](customer_list, orders, NOW) == baseline_report(customer_list, orders, NOW)
+
+@pytest.mark.parametrize("case", ["random", "repeated ids", "no orders"])
+def test_order_files_match_the_original_report(tmp_path, case):
+    customer_list, orders = CASES[case]
+    path = str(tmp_path / "orders.csv")
+    write_csv(path, orders)
+    expected = baseline_report(customer_list, orders, NOW)
+
+    assert analyze_customers(customer_list, read_orders(path), NOW) == expected
+    assert analyze_order_file_parallel(customer_list, path, 3, NOW) == expected
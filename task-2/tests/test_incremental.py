@@ -0,0 +1,82 @@
+from datetime import timedelta
+import pytest
+from customer_analysis import Order, analyze_customers
+from incremental import IncrementalReport
+from random_orders import NOW, make_customers, make_orders
+
+def test_updates_match_a_full_rebuild():
+    customers = make_customers(20)
+    orders = make_orders(300, 20, seed=1)
+    report = IncrementalReport(customers)
+
+    for start in range(0, len(orders), 70):
+        report.update(orders[start:start + 70], NOW)
+
+    assert report.report() == analyze_customers(customers, orders, NOW)
+
+def test_delta_holds_only_changed_rows_in_customer_order():
+    customers = make_customers(3)
+    report = IncrementalReport(customers)
+    report.update([Order("O1", "C0", 600, "Books", NOW), Order("O2", "C2", 700, "Toys", NOW)], NOW)
+
+    delta = report.update([Order("O3", "C2", 10, "Toys", NOW), Order("O4", "C1", 900, "Books", NOW)], NOW)
+
+    assert [row["customerId"] for row in delta.changed] == ["C1", "C2"]
+    assert delta.changed[1]["totalSpent"] == 710
+    assert delta.removed == []
+
+def test_refunds_below_the_minimum_remove_the_row():
+    report = IncrementalReport(make_customers(1))
+    report.update([Order("O1", "C0", 600, "Books", NOW)], NOW)
+
+    delta = report.update([Order("O2", "C0", -200, "Books", NOW)], NOW)
+
+    assert delta == ([], ["C0"])
+    assert report.report() == []
+
+def test_customers_age_out_of_the_activity_window():
+    report = IncrementalReport(make_customers(2))
+    report.update([Order("O1", "C0", 600, "Books", NOW), Order("O2", "C1", 600, "Books", NOW + timedelta(days=10))], NOW)
+
+    delta = report.update(now=NOW + timedelta(days=185))
+
+    assert [(row["customerId"], row["isActive"]) for row in delta.changed] == [("C0", False)]
+    assert report.update(now=NOW + timedelta(days=185)) == ([], [])
+    assert [row["isActive"] for row in report.report()] == [False, True]
+
+def test_reapplied_orders_are_skipped(tmp_path):
+    customers = make_customers(5)
+    orders = make_orders(50, 5)
+    path = str(tmp_path / "state.json")
+    report = IncrementalReport(customers)
+    report.update(orders, NOW)
+    report.save(path)
+    expected = analyze_customers(customers, orders, NOW)
+
+    # A retry of the same file, in this process and after a restart
+    assert report.update(orders[:10], NOW) == ([], [])
+    restored = IncrementalReport.load(path, customers)
+    assert restored.update(orders, NOW) == ([], [])
+    assert report.report() == restored.report() == expected
+
+def test_save_and_load_round_trip(tmp_path):
+    customers = make_customers(10)
+    orders = make_orders(200, 10, seed=2)
+    path = str(tmp_path / "state.json")
+    report = IncrementalReport(customers)
+    report.update(orders[:100], NOW)
+    report.save(path)
+
+    restored = IncrementalReport.load(path, customers)
+
+    assert restored.as_of == NOW
+    assert restored.report() == report.report()
+    # Sums continue exactly from the saved floats
+    assert restored.update(orders[100:], NOW) == report.update(orders[100:], NOW)
+    assert restored.report() == analyze_customers(customers, orders, NOW)
+
+def test_orders_without_ids_are_rejected():
+    report = IncrementalReport(make_customers(1))
+
+    with pytest.raises(ValueError):
+        report.update([Order(None, "C0", 10, "Books", NOW)], NOW)
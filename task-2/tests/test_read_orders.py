@@ -0,0 +1,27 @@
+import time
+from datetime import datetime
+import pytest
+from customer_analysis import read_orders
+
+@pytest.fixture
+def kolkata(monkeypatch):
+    """Run with the local time zone set to UTC+05:30."""
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_dates_are_read_as_naive_local_time(tmp_path, kolkata):
+    path = tmp_path / "orders.csv"
+    path.write_text(
+        "order_id,customer_id,amount,category,date\n"
+        "O1,C1,10.5,Books,2024-01-01T00:00:00+00:00\n"
+        "O2,C1,20,Books,2024-01-01T09:00:00+02:00\n"
+        "O3,C1,30,Books,2024-01-01T12:00:00\n"
+    )
+
+    dates = [order.date for order in read_orders(str(path))]
+
+    assert dates == [datetime(2024, 1, 1, 5, 30), datetime(2024, 1, 1, 12, 30), datetime(2024, 1, 1, 12, 0)]
+    assert all(date.tzinfo is None for date in dates)